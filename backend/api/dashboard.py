@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+from backend.schemas import (
+    BattingStatsResponse, BattingInningWiseResponse, BattingMatchResultWiseResponse, BattingPositionWiseResponse, BattingGroundWiseResponse,
+    BowlingStatsResponse, BowlingInningWiseResponse, BowlingMatchResultWiseResponse, BowlingGroundWiseResponse,
+)
+from backend.models import User, InningType, MatchResult
+from backend.stats import labelled_stats
+from backend.rollups import career_counters, breakdown_counters, batting_stats, bowling_stats
+from backend.cache import cached_response
+from backend.metrics import MeteredRoute
+from .jwt import get_current_user
+from .deps import get_read_db
+from typing import Optional
+
+
+dashboard_router = APIRouter(route_class=MeteredRoute)
+
+# Same key order as the per-breakdown endpoints
+BREAKDOWN_KEYS = {
+    "match_inning": [InningType.FIRST, InningType.SECOND],
+    "match_result": [MatchResult.WON, MatchResult.LOST, MatchResult.NO_RESULT],
+}
+
+def _upper(key):
+    return key.value.upper()
+
+class Section:
+    """One part of the dashboard payload: the career totals (dimension=None) or a breakdown."""
+
+    def __init__(self, stats, model, dimension: str = None, label: str = None, format_key=None):
+        self.stats = stats
+        self.model = model
+        self.dimension = dimension
+        self.label = label
+        self.format_key = format_key
+
+    def dump(self, stats: dict, fields):
+        if fields is not None and self.label:
+            fields = fields | {self.label}
+        return self.model(**stats).model_dump(include=fields)
+
+SECTIONS = {
+    "batting": Section(batting_stats, BattingStatsResponse),
+    "bowling": Section(bowling_stats, BowlingStatsResponse),
+    "batting_innings": Section(batting_stats, BattingInningWiseResponse, "match_inning", "inning_type", _upper),
+    "batting_results": Section(batting_stats, BattingMatchResultWiseResponse, "match_result", "match_result", _upper),
+    "batting_positions": Section(batting_stats, BattingPositionWiseResponse, "batting_position", "batting_position"),
+    "batting_grounds": Section(batting_stats, BattingGroundWiseResponse, "ground", "ground"),
+    "bowling_innings": Section(bowling_stats, BowlingInningWiseResponse, "match_inning", "inning_type", _upper),
+    "bowling_results": Section(bowling_stats, BowlingMatchResultWiseResponse, "match_result", "match_result", _upper),
+    "bowling_grounds": Section(bowling_stats, BowlingGroundWiseResponse, "ground", "ground"),
+}
+
+def parse_fields(fields: Optional[str]):
+    """{section: set of field names, or None for all of them} from e.g. "batting.runs_scored,bowling"."""
+    if not fields:
+        return {name: None for name in SECTIONS}
+    selected = {}
+    for item in filter(None, (part.strip() for part in fields.split(","))):
+        name, _, field = item.partition(".")
+        section = SECTIONS.get(name)
+        if section is None or (field and field not in section.model.model_fields):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown dashboard field '{item}'"
+            )
+        if not field:
+            selected[name] = None
+        elif selected.get(name, set()) is not None:
+            selected.setdefault(name, set()).add(field)
+    return selected
+
+@dashboard_router.get("")
+def get_dashboard(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated sections (" + ", ".join(SECTIONS) + ") or section.field names; all if omitted"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    selected = parse_fields(fields)
+
+    def compute():
+        # One read of the career rollup and one of the group rollups, whatever is selected
+        sections = [(name, SECTIONS[name]) for name in SECTIONS if name in selected]
+        career = career_counters(db, current_user.user_id) if any(section.dimension is None for _, section in sections) else None
+        dimensions = sorted({section.dimension for _, section in sections if section.dimension is not None})
+        groups = breakdown_counters(db, current_user.user_id, dimensions, keys=BREAKDOWN_KEYS) if dimensions else {}
+
+        payload = {}
+        for name, section in sections:
+            if section.dimension is None:
+                payload[name] = section.dump(section.stats(career), selected[name])
+            else:
+                rows = labelled_stats(groups[section.dimension], section.stats, section.label, format_key=section.format_key)
+                payload[name] = [section.dump(stats, selected[name]) for stats in rows]
+        return payload
+
+    return cached_response(request, current_user.user_id, compute)
@@ -0,0 +1,18 @@
+from fastapi import Depends
+from backend.config import settings
+from backend.database import engine, read_engine, get_db, get_replica_db
+from backend.cache import written_recently
+from backend.schemas import TokenData
+from .jwt import get_current_user
+
+
+def get_read_db(current_user: TokenData = Depends(get_current_user)):
+    """Session for read-only endpoints: the replica, unless this user just wrote.
+
+    Users who wrote within REPLICA_READ_YOUR_WRITES_SECONDS read from the
+    primary, so replica lag can't hide their own changes.
+    """
+    if read_engine is engine or written_recently(current_user.user_id, settings.replica_read_your_writes_seconds):
+        yield from get_db()
+    else:
+        yield from get_replica_db()
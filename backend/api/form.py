@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+from backend.schemas import FormWindowResponse, CareerProgressionPoint
+from backend.models import User
+from backend.form import user_series
+from backend.rollups import batting_stats, bowling_stats
+from backend.cache import cached_response
+from backend.metrics import MeteredRoute
+from .jwt import get_current_user
+from .deps import get_read_db
+from typing import List, Optional
+from datetime import date
+
+
+form_router = APIRouter(route_class=MeteredRoute)
+
+DEFAULT_WINDOWS = [5, 10, 20]
+MAX_WINDOWS = 10
+
+def window_response(series, start: int, stop: int, **labels):
+    counters = series.window(start, stop)
+    return FormWindowResponse(batting=batting_stats(counters), bowling=bowling_stats(counters), **labels)
+
+@form_router.get("/get_recent_form", response_model=List[FormWindowResponse])
+def get_recent_form(
+    request: Request,
+    windows: List[int] = Query(DEFAULT_WINDOWS, description="Window sizes in matches, e.g. ?windows=5&windows=10"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    if len(windows) > MAX_WINDOWS or any(size < 1 for size in windows):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Give up to {MAX_WINDOWS} window sizes of at least 1 match"
+        )
+
+    def compute():
+        series = user_series(db, current_user.user_id)
+        responses = []
+        for size in windows:
+            start, stop = series.last(size)
+            responses.append(window_response(
+                series, start, stop,
+                last_matches=size,
+                from_date=series.dates[start] if stop > start else None,
+                to_date=series.dates[stop - 1] if stop > start else None,
+            ))
+        return responses
+
+    return cached_response(request, current_user.user_id, compute)
+
+@form_router.get("/get_date_range_form", response_model=FormWindowResponse)
+def get_date_range_form(
+    request: Request,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    if from_date is not None and to_date is not None and from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must not be after 'to'"
+        )
+
+    def compute():
+        series = user_series(db, current_user.user_id)
+        start, stop = series.between(from_date, to_date)
+        return window_response(series, start, stop, from_date=from_date, to_date=to_date)
+
+    return cached_response(request, current_user.user_id, compute)
+
+@form_router.get("/get_career_progression", response_model=List[CareerProgressionPoint])
+def get_career_progression(request: Request, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    def compute():
+        series = user_series(db, current_user.user_id)
+        points = []
+        for i in range(len(series)):
+            counters = series.window(0, i + 1)
+            batting, bowling = batting_stats(counters), bowling_stats(counters)
+            points.append({
+                "match_id": series.match_ids[i],
+                "date": series.dates[i],
+                "matches": i + 1,
+                "runs_scored": batting["runs_scored"],
+                "batting_average": batting["batting_average"],
+                "batting_strike_rate": batting["batting_strike_rate"],
+                "highest_score": batting["highest_score"],
+                "wickets_taken": bowling["wickets_taken"],
+                "bowling_average": bowling["bowling_average"],
+                "economy_rate": bowling["economy_rate"],
+                "best_bowling": bowling["best_bowling"],
+            })
+        return points
+
+    return cached_response(request, current_user.user_id, compute)
@@ -1,44 +1,86 @@
 from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
+import hashlib
+import json
+import re
+import time
+from backend.cache import LRUCache
+from backend.config import settings
 from backend.schemas import TokenData
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-# Load .env file
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../.env'))
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+MAX_TOKEN_LENGTH = 4096
+# header.payload.signature, each base64url without padding
+TOKEN_SHAPE = re.compile(r"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+def _read_file(path: str):
+    with open(path) as f:
+        return f.read()
+
+# With asymmetric keys the private key signs and tokens name their public key by
+# `kid`; otherwise SECRET_KEY does both
+SIGNING_KEY = _read_file(settings.jwt_private_key_file) if settings.jwt_private_key_file else SECRET_KEY
+VERIFY_KEYS = json.loads(_read_file(settings.jwt_public_keys_file)) if settings.jwt_public_keys_file else {}
+
+# Verified tokens keyed by their SHA-256 digest, so a dashboard's burst of calls
+# with one bearer token only pays for signature verification once
+token_cache = LRUCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl_seconds)
 
 def create_access_token(data: dict):
     # Create a copy of the data to avoid modifying the original
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta (minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    headers = {"kid": settings.jwt_key_id} if settings.jwt_key_id else None
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM, headers=headers)
     return encoded_jwt
 
-def verify_access_token(token: str, credentials_exception):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-        if user_id is None:
-            raise credentials_exception
-        
-        token_data = TokenData(user_id=user_id)
-        return token_data
-    except JWTError:
-        raise credentials_exception
+def _verification_key(token: str):
+    if not VERIFY_KEYS:
+        return SECRET_KEY
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid not in VERIFY_KEYS:
+        raise JWTError("Unknown signing key")
+    return VERIFY_KEYS[kid]
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def _decode(token: str):
+    return jwt.decode(token, _verification_key(token), algorithms=[ALGORITHM])
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    return verify_access_token(token, credentials_exception)
\ No newline at end of file
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    # Reject anything that can't be a JWT before hashing or decoding it
+    if len(token) > MAX_TOKEN_LENGTH or not TOKEN_SHAPE.fullmatch(token):
+        raise credentials_exception()
+
+    key = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        return token_data
+
+    try:
+        payload = _decode(token)
+    except JWTError:
+        raise credentials_exception()
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise credentials_exception()
+
+    token_data = TokenData(user_id=user_id)
+    # Never cache a token past its exp (tokens without one are capped by the cache TTL)
+    remaining = payload["exp"] - time.time() if "exp" in payload else settings.token_cache_ttl_seconds
+    if remaining > 0:
+        token_cache.set(key, token_data, ttl=min(remaining, settings.token_cache_ttl_seconds))
+    return token_data
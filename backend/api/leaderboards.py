@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from backend.schemas import LeaderboardResponse, LeaderboardRow
+from backend.models import User
+from backend.leaderboards import METRICS, SCOPES, top_entries, user_rank, board_size
+from backend.metrics import MeteredRoute
+from .jwt import get_current_user
+from .deps import get_read_db
+
+
+leaderboard_router = APIRouter(route_class=MeteredRoute)
+
+MAX_LEADERBOARD_SIZE = 100
+
+def leaderboard_row(rank: int, entry, username: str):
+    return LeaderboardRow(rank=rank, user_id=entry.user_id, username=username, value=round(entry.value, 2), matches=entry.matches)
+
+@leaderboard_router.get("/get_leaderboard", response_model=LeaderboardResponse)
+def get_leaderboard(
+    metric: str = Query(..., description=", ".join(METRICS)),
+    scope: str = Query("all", description=", ".join(SCOPES)),
+    key: str = Query("", description="The ground name or season year, for those scopes"),
+    limit: int = Query(10, ge=0, le=MAX_LEADERBOARD_SIZE),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    if metric not in METRICS or scope not in SCOPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"metric must be one of {', '.join(METRICS)} and scope one of {', '.join(SCOPES)}"
+        )
+    if (scope == "all") != (key == ""):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give a key for the ground and season scopes, and none for 'all'"
+        )
+
+    board = METRICS[metric]
+    entries = [leaderboard_row(*row) for row in top_entries(db, board, scope, key, limit)]
+    me = user_rank(db, board, scope, key, current_user.user_id)
+    if me is not None:
+        rank, entry = me
+        me = next((row for row in entries if row.user_id == entry.user_id), None) \
+            or leaderboard_row(rank, entry, db.get(User, current_user.user_id).username)
+
+    return LeaderboardResponse(
+        metric=metric, scope=scope, scope_key=key,
+        total=board_size(db, board, scope, key),
+        entries=entries, me=me,
+    )
@@ -1,110 +1,287 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from backend.database import get_db
+from sqlalchemy import insert, tuple_
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from backend.schemas import MatchCreate, MatchResponse, MatchUpdate
+from backend.schemas import (
+    MatchCreate, MatchResponse, MatchUpdate, MatchImportResponse, MatchPageResponse,
+    MatchIdsRequest, MatchBatchUpdateRequest, MatchBatchDeleteResponse, MatchBatchUpdateResponse,
+    BallAppendRequest, BallAppendResponse, BallListResponse,
+)
 from backend.models import Match, User
+from backend.rollups import apply_match_change, apply_match_changes, add_matches
+from backend.cache import bump_version
+from backend.responses import select_match_rows, match_rows, match_response, ndjson_lines
+from backend.mutations import delete_owned, update_owned, miss_reasons
+from backend.seasons import user_season, season_error, matches_outside_seasons
+from backend.balls import encode, decode, event_totals, match_values, tail_chunk, recorded_balls, append_codes, match_codes
+from backend.form import extend_series
+from backend.imports import IMPORT_FORMATS, detect_format, iter_matches
+from backend.metrics import MeteredRoute
 from .jwt import get_current_user
+from .seasons import check_match_season
+from types import SimpleNamespace
+from typing import Optional
+from datetime import date
+import base64
+import csv
 
-match_router = APIRouter()
+match_router = APIRouter(route_class=MeteredRoute)
+
+IMPORT_BATCH_SIZE = 500              # rows per multi-row INSERT and per transaction
+MAX_REPORTED_IMPORT_ERRORS = 1000    # keeps the error report bounded for huge bad files
+MAX_PAGE_SIZE = 200
+EXPORT_FETCH_SIZE = 500              # rows per server-side cursor fetch when exporting
+
+
+def encode_cursor(match_date: date, match_id: int):
+    return base64.urlsafe_b64encode(f"{match_date.isoformat()}:{match_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        match_date, match_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return date.fromisoformat(match_date), int(match_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
 
 @match_router.post("/add_match", response_model=MatchResponse)
 def create_match(match: MatchCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if match.season_id is not None:
+        check_match_season(db, current_user.user_id, match.season_id, match.date)
     new_match_data = match.dict()
     new_match_data['user_id'] = current_user.user_id  # Set the user_id from the authenticated user
     db_match = Match(**new_match_data)
     db.add(db_match)
+    db.flush()
+    apply_match_change(db, new=db_match)
     db.commit()
+    version = bump_version(current_user.user_id)
     db.refresh(db_match)
+    extend_series(current_user.user_id, version, db_match)
     return db_match
 
+@match_router.post("/import_matches", response_model=MatchImportResponse)
+def import_matches(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", description="csv or ndjson; guessed from the file name if omitted"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    fmt = file_format or detect_format(file.filename, file.content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload a .csv or .ndjson file, or pass format=csv|ndjson"
+        )
+
+    report = {"imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def record_failure(row_number, errors):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_IMPORT_ERRORS:
+            report["errors"].append({"row": row_number, "errors": errors})
+        else:
+            report["errors_truncated"] = True
+
+    batch = []
+    seasons = {}
+
+    def row_season_error(row):
+        season_id = row["season_id"]
+        if season_id is None:
+            return None
+        if season_id not in seasons:
+            seasons[season_id] = user_season(db, current_user.user_id, season_id)
+        return season_error(seasons[season_id], season_id, row["date"])
+
+    def flush_batch():
+        # One multi-row INSERT plus the rollup deltas per transaction
+        try:
+            db.execute(insert(Match), [row for _, row in batch])
+            add_matches(db, [SimpleNamespace(**row) for _, row in batch])
+            db.commit()
+            report["imported"] += len(batch)
+        except SQLAlchemyError as e:
+            db.rollback()
+            for row_number, _ in batch:
+                record_failure(row_number, [f"database error: {getattr(e, 'orig', None) or e}"])
+        batch.clear()
+
+    row_number = 0
+    try:
+        for row_number, result in iter_matches(file.file, fmt):
+            if isinstance(result, list):
+                record_failure(row_number, result)
+                continue
+            row = result.model_dump()
+            error = row_season_error(row)
+            if error:
+                record_failure(row_number, [error])
+                continue
+            row["user_id"] = current_user.user_id
+            batch.append((row_number, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush_batch()
+    except (UnicodeDecodeError, csv.Error) as e:
+        record_failure(row_number + 1, [f"unreadable input, import stopped: {e}"])
+    finally:
+        if batch:
+            flush_batch()
+        if report["imported"]:
+            bump_version(current_user.user_id)
+
+    return report
+
 @match_router.get("/get_all_matches", response_model=list[MatchResponse])
 def get_matches(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Only return matches that belong to the current user
-    return db.query(Match).filter(Match.user_id == current_user.user_id).all()
+    rows = db.execute(select_match_rows(Match.user_id == current_user.user_id))
+    return ORJSONResponse(match_rows(rows))
 
-@match_router.get("/get_match/{match_id}", response_model=MatchResponse)
-def get_single_match(match_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Two-step verification process
-    # Step 1: Check if match exists at all
-    db_match = db.query(Match).filter(Match.match_id == match_id).first()
-    if not db_match:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail=f"Match with ID {match_id} not found"
-        )
-    
-    # Step 2: Check if match belongs to current user
-    if db_match.user_id != current_user.user_id:
-        raise HTTPException(
+@match_router.get("/get_matches_page", response_model=MatchPageResponse)
+def get_matches_page(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Keyset pagination, newest first: each page seeks past the last (date, match_id)
+    # seen instead of using OFFSET, so every page costs the same
+    statement = select_match_rows(Match.user_id == current_user.user_id)
+    if cursor:
+        statement = statement.where(tuple_(Match.date, Match.match_id) < decode_cursor(cursor))
+    statement = statement.order_by(Match.date.desc(), Match.match_id.desc()).limit(limit + 1)
+    matches = match_rows(db.execute(statement))
+
+    next_cursor = None
+    if len(matches) > limit:
+        matches = matches[:limit]
+        next_cursor = encode_cursor(matches[-1]["date"], matches[-1]["match_id"])
+    return ORJSONResponse({"matches": matches, "next_cursor": next_cursor})
+
+@match_router.get("/export_matches")
+def export_matches(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Stream all of the user's matches as NDJSON, oldest first."""
+    statement = (
+        select_match_rows(Match.user_id == current_user.user_id)
+        .order_by(Match.date, Match.match_id)
+        .execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+
+    def generate():
+        # yield_per uses a server-side cursor, so only one fetch is held in memory
+        for partition in db.execute(statement).partitions():
+            yield ndjson_lines(partition)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def match_missing(db: Session, user_id: int, match_id: int, forbidden_detail: str):
+    # Only reached when the owner-scoped statement matched nothing
+    reason = miss_reasons(db, user_id, [match_id]).get(match_id)
+    if reason == "forbidden":
+        return HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to view someone else's match"
+            detail=forbidden_detail
         )
-    
-    return db_match
+    if reason == "locked":
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Match with ID {match_id} is in a closed season; reopen the season to change it"
+        )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Match with ID {match_id} not found"
+    )
 
-@match_router.delete("/delete_match/{match_id}", response_model=dict)
-def delete_match(match_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Two-step verification process
-    # Step 1: Check if match exists at all
-    db_match = db.query(Match).filter(Match.match_id == match_id).first()
-    if not db_match:
+def update_values(match: MatchUpdate):
+    # Only include fields that were explicitly set and are not None
+    update_data = {
+        field: value for field, value in match.model_dump().items()
+        if field in match.model_fields_set and value is not None
+    }
+
+    # Prevent user from changing the user_id (security measure)
+    if 'user_id' in update_data:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail=f"Match with ID {match_id} not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot change the user_id of a match"
         )
-    
-    # Step 2: Check if match belongs to current user
-    if db_match.user_id != current_user.user_id:
+
+    # balls_bowled is derived from overs_bowled, so it follows any overs change
+    if 'overs_bowled' in update_data:
+        update_data['balls_bowled'] = match.balls_bowled
+    return update_data
+
+def split_misses(db: Session, user_id: int, match_ids, found_ids):
+    """not_found, forbidden and locked among the requested ids the user's statement didn't touch."""
+    missed = [match_id for match_id in dict.fromkeys(match_ids) if match_id not in found_ids]
+    reasons = miss_reasons(db, user_id, missed)
+    return {
+        "not_found": [i for i in missed if i not in reasons],
+        "forbidden": [i for i in missed if reasons.get(i) == "forbidden"],
+        "locked": [i for i in missed if reasons.get(i) == "locked"],
+    }
+
+def check_season_change(db: Session, user_id: int, update_data: dict):
+    # The target season must be the user's and open; dates are checked against it after the update
+    if update_data.get('season_id') is not None:
+        check_match_season(db, user_id, update_data['season_id'], update_data.get('date'))
+
+def reject_outside_seasons(db: Session, update_data: dict, new_rows):
+    # A new date or season can leave a match outside its season's range
+    if 'date' not in update_data and 'season_id' not in update_data:
+        return
+    outside = matches_outside_seasons(db, [row.match_id for row in new_rows])
+    if outside:
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to delete this match"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Match date outside its season for match IDs {sorted(outside)}"
         )
-    
-    db.delete(db_match)
+
+@match_router.get("/get_match/{match_id}", response_model=MatchResponse)
+def get_single_match(match_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    row = db.execute(select_match_rows(Match.match_id == match_id, Match.user_id == current_user.user_id)).first()
+    if row is None:
+        raise match_missing(db, current_user.user_id, match_id, "You don't have permission to view someone else's match")
+    return ORJSONResponse(match_rows([row])[0])
+
+@match_router.delete("/delete_match/{match_id}", response_model=dict)
+def delete_match(match_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    deleted = delete_owned(db, current_user.user_id, [match_id])
+    if not deleted:
+        raise match_missing(db, current_user.user_id, match_id, "You don't have permission to delete this match")
+
+    apply_match_change(db, old=deleted[0])
     db.commit()
+    bump_version(current_user.user_id)
     return {"message": "Match deleted successfully"}
 
 @match_router.patch("/update_match/{match_id}", response_model=MatchResponse)
 def update_match(match_id: int, match: MatchUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     try:
-        # Two-step verification process
-        # Step 1: Check if match exists at all
-        db_match = db.query(Match).filter(Match.match_id == match_id).first()
-        if not db_match:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Match with ID {match_id} not found"
-            )
-        
-        # Step 2: Check if match belongs to current user
-        if db_match.user_id != current_user.user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to update this match"
-            )
-
-        # Get the raw dictionary and filter out unset and None values
-        update_data = {}
-        for field, value in match.dict().items():
-            # Only include fields that were explicitly set and are not None
-            if field in match.model_fields_set and value is not None:
-                update_data[field] = value
-        
-        # Prevent user from changing the user_id (security measure)
-        if 'user_id' in update_data:
-            del update_data['user_id']
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="You cannot change the user_id of a match"
-            )
-        
-        # Update only the provided non-None fields
-        for field, value in update_data.items():
-            setattr(db_match, field, value)
+        update_data = update_values(match)
+        check_season_change(db, current_user.user_id, update_data)
+        if update_data:
+            old_rows, new_rows = update_owned(db, current_user.user_id, [match_id], update_data)
+        else:
+            old_rows, new_rows = [], db.execute(select_match_rows(Match.match_id == match_id, Match.user_id == current_user.user_id)).all()
+        if not new_rows:
+            db.rollback()
+            raise match_missing(db, current_user.user_id, match_id, "You don't have permission to update this match")
+        if not old_rows:
+            return ORJSONResponse(match_response(new_rows[0]))
 
+        reject_outside_seasons(db, update_data, new_rows)
+        apply_match_change(db, old=old_rows[0], new=new_rows[0])
         db.commit()
-        db.refresh(db_match)
-        return db_match
+        bump_version(current_user.user_id)
+        return ORJSONResponse(match_response(new_rows[0]))
     except HTTPException:
         # Re-raise HTTP exceptions (our custom 404/403 errors)
         raise
@@ -114,3 +291,78 @@ def update_match(match_id: int, match: MatchUpdate, db: Session = Depends(get_db
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error updating match: {str(e)}"
         )
+
+@match_router.post("/delete_matches", response_model=MatchBatchDeleteResponse)
+def delete_matches(request: MatchIdsRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Delete several of the user's matches in one statement.
+
+    Ids that don't exist come back under `not_found`, other users' matches
+    under `forbidden` and matches of closed seasons under `locked`; the rest
+    are deleted.
+    """
+    deleted = delete_owned(db, current_user.user_id, request.match_ids)
+    if deleted:
+        apply_match_changes(db, old=deleted)
+        db.commit()
+        bump_version(current_user.user_id)
+    deleted_ids = {row.match_id for row in deleted}
+    return {"deleted": sorted(deleted_ids), **split_misses(db, current_user.user_id, request.match_ids, deleted_ids)}
+
+@match_router.patch("/update_matches", response_model=MatchBatchUpdateResponse)
+def update_matches(request: MatchBatchUpdateRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Apply the same changes to several of the user's matches in one statement.
+
+    Reports ids as delete_matches does; `updated` holds the matches as they now are.
+    """
+    update_data = update_values(request.changes)
+    check_season_change(db, current_user.user_id, update_data)
+    if update_data:
+        old_rows, new_rows = update_owned(db, current_user.user_id, request.match_ids, update_data)
+        if new_rows:
+            reject_outside_seasons(db, update_data, new_rows)
+            apply_match_changes(db, old=old_rows, new=new_rows)
+            db.commit()
+            bump_version(current_user.user_id)
+        updated = [match_response(row) for row in new_rows]
+    else:
+        rows = db.execute(select_match_rows(Match.match_id.in_(request.match_ids), Match.user_id == current_user.user_id))
+        updated = match_rows(rows)
+    updated.sort(key=lambda match: match["match_id"])
+    misses = split_misses(db, current_user.user_id, request.match_ids, {match["match_id"] for match in updated})
+    return ORJSONResponse({"updated": updated, **misses})
+
+@match_router.post("/add_balls/{match_id}", response_model=BallAppendResponse)
+def add_balls(match_id: int, request: BallAppendRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Append ball-by-ball events to a match and add them to its totals.
+
+    With `offset` set to the number of balls the client knows are recorded, a
+    retried request is refused with 409 instead of counting its balls twice.
+    """
+    codes = [encode(ball.role, ball.runs, ball.boundary, ball.extra, ball.extra_runs, ball.wicket) for ball in request.balls]
+    # update_owned() takes the write lock before reading the old row, so appends
+    # to the match queue up here and each sees the balls before it
+    old_rows, new_rows = update_owned(db, current_user.user_id, [match_id], match_values(event_totals(codes)))
+    if not new_rows:
+        db.rollback()
+        raise match_missing(db, current_user.user_id, match_id, "You don't have permission to score this match")
+
+    tail = tail_chunk(db, match_id)
+    recorded = recorded_balls(tail)
+    if request.offset is not None and request.offset != recorded:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Match with ID {match_id} has {recorded} balls recorded, not {request.offset}"
+        )
+    append_codes(db, match_id, tail, codes)
+    apply_match_change(db, old=old_rows[0], new=new_rows[0])
+    db.commit()
+    bump_version(current_user.user_id)
+    return ORJSONResponse({"recorded": recorded + len(codes), "match": match_response(new_rows[0])})
+
+@match_router.get("/get_balls/{match_id}", response_model=BallListResponse)
+def get_balls(match_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    codes = match_codes(db, current_user.user_id, match_id)
+    if not codes and db.execute(select_match_rows(Match.match_id == match_id, Match.user_id == current_user.user_id)).first() is None:
+        raise match_missing(db, current_user.user_id, match_id, "You don't have permission to view someone else's match")
+    return ORJSONResponse({"match_id": match_id, "balls": [decode(code) for code in codes]})
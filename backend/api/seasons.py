@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from backend.database import get_db
+from backend.schemas import SeasonCreate, SeasonResponse
+from backend.models import Season, User
+from backend.rollups import career_counters, group_counters
+from backend.seasons import user_season, season_error, season_counters, season_group_counters, freeze_season, reopen_season
+from backend.cache import bump_version
+from backend.metrics import MeteredRoute
+from .jwt import get_current_user
+
+
+season_router = APIRouter(route_class=MeteredRoute)
+
+# The season_id query parameter of the stats routes
+SEASON_FILTER = Query(None, description="Only this season's or tournament's matches")
+
+def get_season_or_404(db: Session, user_id: int, season_id: int):
+    season = user_season(db, user_id, season_id)
+    if season is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Season with ID {season_id} not found"
+        )
+    return season
+
+def check_match_season(db: Session, user_id: int, season_id: int, match_date=None):
+    """Reject putting a match in a missing (404), closed (409) or non-covering (400) season."""
+    season = user_season(db, user_id, season_id)
+    error = season_error(season, season_id, match_date)
+    if error:
+        if season is None:
+            code = status.HTTP_404_NOT_FOUND
+        elif season.closed_at is not None:
+            code = status.HTTP_409_CONFLICT
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        raise HTTPException(status_code=code, detail=error)
+
+def counters_for(db: Session, user_id: int, season_id: Optional[int]):
+    # Career rollup, or one season's (frozen or aggregated) counters
+    if season_id is None:
+        return career_counters(db, user_id)
+    return season_counters(db, get_season_or_404(db, user_id, season_id))
+
+def groups_for(db: Session, user_id: int, season_id: Optional[int], dimension: str, keys=None):
+    if season_id is None:
+        return group_counters(db, user_id, dimension, keys=keys)
+    return season_group_counters(db, get_season_or_404(db, user_id, season_id), dimension, keys=keys)
+
+@season_router.post("/add_season", response_model=SeasonResponse, status_code=status.HTTP_201_CREATED)
+def create_season(season: SeasonCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    db_season = Season(**season.model_dump(), user_id=current_user.user_id)
+    db.add(db_season)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"You already have a season named {season.name!r}"
+        )
+    db.refresh(db_season)
+    return db_season
+
+@season_router.get("/get_seasons", response_model=List[SeasonResponse])
+def get_seasons(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return db.query(Season).filter(Season.user_id == current_user.user_id).order_by(Season.start_date, Season.season_id).all()
+
+@season_router.post("/close_season/{season_id}", response_model=SeasonResponse)
+def close_season(season_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Freeze the season's stats; its matches are read-only until it is reopened."""
+    season = get_season_or_404(db, current_user.user_id, season_id)
+    freeze_season(db, season)
+    db.commit()
+    bump_version(current_user.user_id)
+    db.refresh(season)
+    return season
+
+@season_router.post("/reopen_season/{season_id}", response_model=SeasonResponse)
+def reopen_closed_season(season_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    season = get_season_or_404(db, current_user.user_id, season_id)
+    reopen_season(db, season)
+    db.commit()
+    bump_version(current_user.user_id)
+    db.refresh(season)
+    return season
@@ -1,57 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from backend.database import get_db
-from backend.schemas import UserBase, UserResponse, Token
+from backend.database import get_async_db
+from backend.config import settings
+from backend.schemas import UserBase, UserResponse, UserProvisionRequest, UserProvisionResponse, SkippedUser, Token, TokenData
 from backend.models import User
-from backend.utils import verify_password, get_password_hash
+from backend.rollups import UPSERT_DIALECTS
+from backend.utils import hash_password, hash_passwords, verify_and_update_password, PasswordHasherBusy
+from backend.ratelimit import client_ip, login_by_ip, login_by_username, register_by_ip
+from backend.metrics import MeteredRoute
 from . import jwt
 
-user_router = APIRouter()
+user_router = APIRouter(route_class=MeteredRoute)
 
-@user_router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserBase, db: Session = Depends(get_db)):
-    try:
-        # Check if username exists
-        if (db.query(User).filter(User.username == user.username).first()) or (db.query(User).filter(User.email == user.email).first()):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Username or email already registered"
-            )
-        
-        # Create new user with hashed password
-        hashed_password = get_password_hash(user.password)
-        db_user = User(
-            username=user.username,
-            email=user.email,
-            hashed_password=hashed_password
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalar_one_or_none()
+
+async def check_password(db: AsyncSession, user: User, password: str):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid username or password"
         )
+    # Stored hash used an old bcrypt cost; upgrade it while we have the plaintext
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+def limit_login(request: Request, user_credentials: OAuth2PasswordRequestForm = Depends()):
+    # Per IP against spraying many accounts, per username against hammering one
+    login_by_ip.check(client_ip(request))
+    login_by_username.check(user_credentials.username.lower())
+
+def limit_register(request: Request):
+    register_by_ip.check(client_ip(request))
+
+USER_INSERT_BATCH_SIZE = 500    # rows per multi-row INSERT when provisioning
+MAX_PROVISION_USERS = 5000
 
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)  # Refresh to get the updated user with ID
-        
-        # Create response that matches UserResponse schema
-        return UserResponse(
-            content="User registered successfully",
-            id=db_user.id,
-            username=db_user.username,
-            email=db_user.email
+def insert_users(dialect: str):
+    # Rows that hit the username/email unique indexes are skipped by the
+    # database and just don't come back from RETURNING
+    if dialect in UPSERT_DIALECTS:
+        statement = UPSERT_DIALECTS[dialect](User).on_conflict_do_nothing()
+    else:
+        statement = insert(User)
+    return statement.returning(User.id, User.username, User.email)
+
+async def registered(db: AsyncSession, usernames, emails):
+    """(username, email) of existing users holding any of these usernames or emails."""
+    result = await db.execute(
+        select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    )
+    return result.all()
+
+async def require_admin(current_user: TokenData = Depends(jwt.get_current_user), db: AsyncSession = Depends(get_async_db)):
+    username = (await db.execute(select(User.username).where(User.id == current_user.user_id))).scalar_one_or_none()
+    if username is None or username not in settings.admin_usernames:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
         )
-        
+
+def already_registered():
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Username or email already registered"
+    )
+
+@user_router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_register)])
+async def register_user(user: UserBase, db: AsyncSession = Depends(get_async_db)):
+    try:
+        # One indexed lookup turns away obvious duplicates before paying for bcrypt
+        if await registered(db, [user.username], [user.email]):
+            raise already_registered()
+
+        hashed_password = await hash_password(user.password)
+        # The unique indexes settle a race with a concurrent registration
+        try:
+            result = await db.execute(
+                insert_users(db.bind.dialect.name),
+                {"username": user.username, "email": user.email, "hashed_password": hashed_password},
+            )
+            row = result.first()
+        except IntegrityError:
+            row = None
+        if row is None:
+            await db.rollback()
+            raise already_registered()
+        await db.commit()
+
+        return UserResponse(id=row.id, username=row.username, email=row.email)
+
+    except (HTTPException, PasswordHasherBusy):
+        raise
     except Exception as e:
-        db.rollback()  # Rollback the transaction on any error
+        await db.rollback()  # Rollback the transaction on any error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+@user_router.post("/provision_users", response_model=UserProvisionResponse, dependencies=[Depends(require_admin)])
+async def provision_users(request: UserProvisionRequest, db: AsyncSession = Depends(get_async_db)):
+    """Create many accounts at once, e.g. a whole league (admins only).
+
+    Users whose username or email is taken, or repeated within the request,
+    are reported under `skipped`; everyone else is created.
+    """
+    if len(request.users) > MAX_PROVISION_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PROVISION_USERS} users per request"
+        )
+
+    skipped = []
+    seen_usernames, seen_emails, candidates = set(), set(), []
+    for user in request.users:
+        if user.username in seen_usernames or user.email in seen_emails:
+            skipped.append(SkippedUser(username=user.username, email=user.email, reason="duplicate in request"))
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        candidates.append(user)
+
+    # One lookup for the whole batch, so existing users cost no bcrypt work
+    taken = await registered(db, seen_usernames, seen_emails)
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+    new_users = []
+    for user in candidates:
+        if user.username in taken_usernames or user.email in taken_emails:
+            skipped.append(SkippedUser(username=user.username, email=user.email, reason="already registered"))
+        else:
+            new_users.append(user)
+
+    hashed_passwords = await hash_passwords([user.password for user in new_users])
+    rows = [
+        {"username": user.username, "email": user.email, "hashed_password": hashed_password}
+        for user, hashed_password in zip(new_users, hashed_passwords)
+    ]
+    created = []
+    statement = insert_users(db.bind.dialect.name)
+    for start in range(0, len(rows), USER_INSERT_BATCH_SIZE):
+        created.extend((await db.execute(statement.values(rows[start:start + USER_INSERT_BATCH_SIZE]))).all())
+    await db.commit()
+
+    # Anyone not returned lost a race with a concurrent registration
+    created_usernames = {row.username for row in created}
+    skipped.extend(
+        SkippedUser(username=user.username, email=user.email, reason="already registered")
+        for user in new_users if user.username not in created_usernames
+    )
+    return {
+        "created": [UserResponse(id=row.id, username=row.username, email=row.email) for row in created],
+        "skipped": skipped,
+    }
+
 # JSON-based login (for frontend fetch requests) - THIS IS WHAT YOUR FRONTEND NEEDS
-@user_router.post("/login", response_model=Token)
-async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@user_router.post("/login", response_model=Token, dependencies=[Depends(limit_login)])
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # Find user by username
-    user = db.query(User).filter(User.username == user_credentials.username).first()
+    user = await get_user_by_username(db, user_credentials.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -59,11 +174,7 @@ async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Ses
         )
     
     # Verify password
-    if not verify_password(user_credentials.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Invalid username or password"
-        )
+    await check_password(db, user, user_credentials.password)
     
     # Create access token
     access_token = jwt.create_access_token(data={"user_id": user.id})
@@ -71,21 +182,17 @@ async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Ses
     return {"access_token": access_token, "token_type": "bearer"}
 
 # OAuth2 form-based login (for Swagger UI and OAuth2 compatibility)
-@user_router.post("/login/form", response_model=Token)
-async def login_form(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@user_router.post("/login/form", response_model=Token, dependencies=[Depends(limit_login)])
+async def login_form(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login with form data (for Swagger UI)"""
-    user = db.query(User).filter(User.username == user_credentials.username).first()
+    user = await get_user_by_username(db, user_credentials.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid username or password"
         )
     
-    if not verify_password(user_credentials.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Invalid username or password"
-        )
+    await check_password(db, user, user_credentials.password)
     
     access_token = jwt.create_access_token(data={"user_id": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Content-hashed static asset URLs and cache headers for /static.
+
+Templates link assets through asset_url('css/login.css'). After
+`python -m scripts.build_assets`, that resolves through
+frontend/static/dist/manifest.json to a copy whose file name carries its content
+hash. Without a build it falls back to the source file with ?v=<hash>.
+Either way the URL changes whenever the content does, so AssetStaticFiles
+serves those URLs as immutable for a year. Unversioned URLs get no-cache and
+revalidate through ETag / Last-Modified.
+
+The build also writes .br / .gz siblings of text assets and resized image
+variants (see asset_srcset()). AssetStaticFiles serves a pre-compressed
+sibling when the client accepts its encoding, so those files are compressed
+once at build time rather than on every request.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+from functools import lru_cache
+from urllib.parse import parse_qs
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from .compression import SUFFIXES, add_vary, choose_encoding
+
+STATIC_DIR = "frontend/static"
+STATIC_URL = "/static"
+DIST_DIR = "dist"
+MANIFEST_PATH = os.path.join(STATIC_DIR, DIST_DIR, "manifest.json")
+HASH_LENGTH = 12
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def content_hash(data: bytes):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def load_manifest(path: str = MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+manifest = load_manifest()
+
+
+@lru_cache(maxsize=None)
+def source_hash(path: str):
+    # Cached for the life of the process, like the manifest
+    try:
+        with open(os.path.join(STATIC_DIR, path), "rb") as f:
+            return content_hash(f.read())
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+
+
+def asset_url(path: str):
+    """Versioned URL for a file under frontend/static."""
+    entry = manifest.get(path)
+    if entry is not None:
+        return f"{STATIC_URL}/{entry['file']}"
+    digest = source_hash(path)
+    return f"{STATIC_URL}/{path}?v={digest}" if digest else f"{STATIC_URL}/{path}"
+
+
+def asset_srcset(path: str, image_format: str = None):
+    """srcset of the built width variants of an image, optionally of one format; "" without a build."""
+    variants = manifest.get(path, {}).get("variants", [])
+    return ", ".join(
+        f"{STATIC_URL}/{variant['file']} {variant['width']}w"
+        for variant in variants if image_format is None or variant["format"] == image_format
+    )
+
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles with pre-compressed siblings and Cache-Control (see module docstring)."""
+
+    async def get_response(self, path: str, scope):
+        request_headers = Headers(scope=scope)
+        response = None
+        if path.startswith(DIST_DIR + "/"):
+            response = await self._precompressed_response(path, request_headers)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if self._is_versioned(path, scope) else REVALIDATE
+        return response
+
+    async def _precompressed_response(self, path: str, request_headers: Headers):
+        accept_encoding = request_headers.get("accept-encoding", "")
+        for encoding, suffix in SUFFIXES.items():
+            if choose_encoding(accept_encoding, available=(encoding,)) is None:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                break
+        else:
+            return None
+        # Media type from the original name, not the .br / .gz one
+        media_type = mimetypes.guess_type(path)[0] or "text/plain"
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type, headers={"Content-Encoding": encoding})
+        add_vary(response.headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers):
+        # If-None-Match compares weakly; CompressionMiddleware hands clients W/ tags
+        if_none_match = request_headers.get("if-none-match")
+        etag = response_headers.get("etag")
+        if if_none_match and etag:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or etag.removeprefix("W/") in tags:
+                return True
+        return super().is_not_modified(response_headers, request_headers)
+
+    def _is_versioned(self, path: str, scope):
+        if path.startswith(DIST_DIR + "/"):
+            return True
+        version = parse_qs(scope.get("query_string", b"").decode()).get("v")
+        return bool(version) and version[0] == source_hash(path)
@@ -0,0 +1,185 @@
+"""Ball-by-ball events, packed into integer codes and stored in chunks.
+
+Every event is one 16-bit code:
+
+    bits 0-2    runs off the bat (0-7)
+    bits 3-5    extra runs on the ball, a wide's or no-ball's penalty included (0-7)
+    bits 6-8    ExtraType, as its position in the enum
+    bits 9-11   DismissalType, likewise
+    bit  12     boundary: the bat runs were a four or a six
+    bits 13-14  BallRole
+
+A match's codes are stored little-endian in BallChunk rows of CHUNK_BALLS
+codes each. A 20-over innings then costs one 240-byte value instead of 120
+rows, and an append rewrites only the last chunk.
+
+Match keeps the per-match totals that every stats path reads. An append turns
+only the new codes into column increments (event_totals) and adds them in the
+owner-scoped UPDATE. The rollups, leaderboards and caches then take the same
+delta path as an edit.
+"""
+import sys
+from array import array
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from .models import Match, BallChunk, BallRole, ExtraType, DismissalType, YesorNo
+
+CHUNK_BALLS = 256
+CODE_BYTES = 2
+
+ROLES = list(BallRole)
+EXTRAS = list(ExtraType)
+DISMISSALS = list(DismissalType)
+
+_BATTING, _BOWLING, _FIELDING = (ROLES.index(role) for role in (BallRole.BATTING, BallRole.BOWLING, BallRole.FIELDING))
+_WIDE, _NO_BALL = EXTRAS.index(ExtraType.WIDE), EXTRAS.index(ExtraType.NO_BALL)
+# Dismissals credited to the bowler, and the fielding column each fielder's dismissal counts towards
+_BOWLER_WICKETS = {DISMISSALS.index(kind) for kind in (
+    DismissalType.BOWLED, DismissalType.CAUGHT, DismissalType.LBW, DismissalType.STUMPED, DismissalType.HIT_WICKET)}
+_FIELDING_COLUMNS = {
+    DISMISSALS.index(DismissalType.CAUGHT): "catches",
+    DISMISSALS.index(DismissalType.RUN_OUT): "run_outs",
+    DISMISSALS.index(DismissalType.STUMPED): "stumpings",
+}
+_NOT_OUT = DISMISSALS.index(DismissalType.NONE)
+
+INCREMENT_COLUMNS = (
+    "runs_scored", "balls_faced", "fours", "sixes",
+    "balls_bowled", "runs_conceded", "wickets", "wides", "no_balls",
+    "catches", "run_outs", "stumpings",
+)
+
+
+def encode(role: BallRole, runs: int, boundary: bool, extra: ExtraType, extra_runs: int, wicket: DismissalType):
+    return (
+        runs
+        | extra_runs << 3
+        | EXTRAS.index(extra) << 6
+        | DISMISSALS.index(wicket) << 9
+        | int(boundary) << 12
+        | ROLES.index(role) << 13
+    )
+
+
+def decode(code: int):
+    return {
+        "role": ROLES[code >> 13 & 3],
+        "runs": code & 7,
+        "boundary": bool(code >> 12 & 1),
+        "extra": EXTRAS[code >> 6 & 7],
+        "extra_runs": code >> 3 & 7,
+        "wicket": DISMISSALS[code >> 9 & 7],
+    }
+
+
+def pack(codes):
+    packed = array("H", codes)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack(data: bytes):
+    codes = array("H")
+    codes.frombytes(data)
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return codes
+
+
+def event_totals(codes):
+    """What these events add to their match: {column: increment}, plus the
+    "batted" and "dismissed" flags for came_to_bat and out."""
+    totals = dict.fromkeys(INCREMENT_COLUMNS, 0)
+    totals["batted"] = totals["dismissed"] = False
+    for code in codes:
+        role, runs, wicket = code >> 13 & 3, code & 7, code >> 9 & 7
+        extra, extra_runs = code >> 6 & 7, code >> 3 & 7
+        if role == _BATTING:
+            totals["batted"] = True
+            totals["runs_scored"] += runs
+            totals["balls_faced"] += extra != _WIDE
+            if code >> 12 & 1:
+                totals["fours"] += runs == 4
+                totals["sixes"] += runs == 6
+            totals["dismissed"] |= wicket != _NOT_OUT
+        elif role == _BOWLING:
+            totals["balls_bowled"] += extra not in (_WIDE, _NO_BALL)
+            # Byes and leg byes aren't charged to the bowler
+            totals["runs_conceded"] += runs + (extra_runs if extra in (_WIDE, _NO_BALL) else 0)
+            totals["wickets"] += wicket in _BOWLER_WICKETS
+            totals["wides"] += extra == _WIDE
+            totals["no_balls"] += extra == _NO_BALL
+        elif role == _FIELDING and wicket in _FIELDING_COLUMNS:
+            totals[_FIELDING_COLUMNS[wicket]] += 1
+    return totals
+
+
+def match_values(totals: dict):
+    """UPDATE values that add event_totals() to a match row in place."""
+    values = {
+        column: func.coalesce(getattr(Match, column), 0) + increment
+        for column, increment in totals.items()
+        if column in INCREMENT_COLUMNS and increment
+    }
+    if "balls_bowled" in values:
+        # overs_bowled follows in cricket notation: integer overs, then balls as tenths
+        balls = values["balls_bowled"]
+        values["overs_bowled"] = balls // 6 + (balls % 6) / 10.0
+    if totals["batted"]:
+        values["came_to_bat"] = YesorNo.YES
+    if totals["dismissed"]:
+        values["out"] = YesorNo.YES
+    return values
+
+
+def tail_chunk(db: Session, match_id: int):
+    """The match's last chunk (chunk_no, codes), or None before its first ball."""
+    statement = (
+        select(BallChunk.chunk_no, BallChunk.codes)
+        .where(BallChunk.match_id == match_id)
+        .order_by(BallChunk.chunk_no.desc())
+        .limit(1)
+    )
+    return db.execute(statement).first()
+
+
+def recorded_balls(tail):
+    # Every chunk before the last is full
+    return 0 if tail is None else tail.chunk_no * CHUNK_BALLS + len(tail.codes) // CODE_BYTES
+
+
+def append_codes(db: Session, match_id: int, tail, codes):
+    """Append codes after `tail`: top up the last chunk, then start new ones."""
+    chunk_bytes = CHUNK_BALLS * CODE_BYTES
+    if tail is not None and len(tail.codes) < chunk_bytes:
+        data, first = tail.codes + pack(codes), tail.chunk_no
+    else:
+        data, first = pack(codes), (0 if tail is None else tail.chunk_no + 1)
+    pieces = [data[start:start + chunk_bytes] for start in range(0, len(data), chunk_bytes)]
+    if tail is not None and first == tail.chunk_no:
+        db.execute(
+            update(BallChunk)
+            .where(BallChunk.match_id == match_id, BallChunk.chunk_no == first)
+            .values(codes=pieces[0])
+        )
+        pieces, first = pieces[1:], first + 1
+    if pieces:
+        db.execute(insert(BallChunk), [
+            {"match_id": match_id, "chunk_no": first + offset, "codes": piece}
+            for offset, piece in enumerate(pieces)
+        ])
+
+
+def match_codes(db: Session, user_id: int, match_id: int):
+    """Every event code of one of the user's matches, in order."""
+    statement = (
+        select(BallChunk.codes)
+        .join(Match, Match.match_id == BallChunk.match_id)
+        .where(BallChunk.match_id == match_id, Match.user_id == user_id)
+        .order_by(BallChunk.chunk_no)
+    )
+    codes = array("H")
+    for data in db.execute(statement).scalars():
+        codes.extend(unpack(data))
+    return codes
@@ -0,0 +1,120 @@
+import hashlib
+import orjson
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from .config import settings
+from .store import store
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a size bound and per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+stats_cache = LRUCache(
+    maxsize=settings.stats_cache_size,
+    ttl=settings.stats_cache_ttl_seconds,
+)
+
+# Per-user data version, bumped on every match write. Cached responses are keyed
+# by it, so a write makes all of that user's entries unreachable at once. It
+# lives in the shared store, so a write through any worker invalidates them all.
+def data_version(user_id: int):
+    return store.get(f"version:{user_id}") or 0
+
+
+def bump_version(user_id: int):
+    version = store.incr(f"version:{user_id}")
+    store.set(f"last-write:{user_id}", time.time(), ttl=settings.replica_read_your_writes_seconds)
+    return version
+
+
+def written_recently(user_id: int, seconds: float):
+    last_write = store.get(f"last-write:{user_id}")
+    return last_write is not None and time.time() - last_write < seconds
+
+
+def _etag_matches(if_none_match: str, etag: str):
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model):
+    return TypeAdapter(response_model)
+
+
+def _render(request: Request, value):
+    route = request.scope.get("route")
+    if getattr(route, "response_model", None) is not None:
+        adapter = _adapter(route.response_model)
+        return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return orjson.dumps(value)
+
+
+def cached_response(request: Request, user_id: int, compute):
+    """Serve a per-user JSON payload from the stats cache, with ETag revalidation.
+
+    Bodies are cached in this process and, with a shared store, in the store
+    too, so one worker's computed body serves the others. `compute` is only
+    called when neither has it, and its result is validated against the
+    route's response_model as FastAPI would, then serialized by pydantic-core
+    (or orjson for routes without a model). Clients sending a matching
+    If-None-Match get an empty 304 instead of the body.
+    """
+    # Read the version before computing so a concurrent write can't be cached under it
+    key = (user_id, data_version(user_id), request.url.path, request.url.query)
+    entry = stats_cache.get(key)
+    if entry is None:
+        shared_key = "stats:{}:{}:{}?{}".format(*key)
+        body = store.get(shared_key) if store.shared else None
+        if body is None:
+            body = _render(request, compute())
+            if store.shared:
+                store.set(shared_key, body, ttl=settings.stats_cache_ttl_seconds)
+        entry = (body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+        stats_cache.set(key, entry)
+
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,156 @@
+"""Rolling and date-windowed form stats from per-user prefix sums.
+
+A FormSeries holds one user's matches in (date, match_id) order. For every
+additive counter it keeps a running total, so the counters for any run of
+consecutive matches are one subtraction per field. The running maxima (highest
+score, best bowling) can't be subtracted, so they use a sparse table instead:
+level k holds the maximum of each run of 2**k matches, and any window is
+covered by two overlapping runs. Building a series is one pass over the user's
+matches (plus the log n sparse table levels); a window is then answered in O(1)
+and a date range in O(log n) to find its ends.
+
+Series are cached per user and keyed by the user's data version like the stats
+cache. A match added after the user's latest one is appended in place, anything
+else (backdated matches, edits, deletes, imports) rebuilds on the next read.
+Appends only ever extend the lists, and `size` is bumped once a match is fully
+in, so readers work on a snapshot() that is pinned to the matches it saw.
+"""
+import copy
+import threading
+from bisect import bisect_left, bisect_right
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .cache import LRUCache, data_version
+from .config import settings
+from .models import Match
+from .rollups import ADDITIVE_FIELDS, MAX_FIELDS, match_counters
+
+
+class FormSeries:
+    """Prefix sums and range maxima over one user's matches in date order."""
+
+    def __init__(self):
+        self.dates = []
+        self.match_ids = []
+        self.prefix = {field: [0] for field in ADDITIVE_FIELDS}
+        self.sparse = {field: [[]] for field in MAX_FIELDS}
+        self.size = 0      # matches fully appended; nothing at or past it is read
+
+    def __len__(self):
+        return self.size
+
+    def snapshot(self):
+        """A view of the series as it is now, unaffected by later appends."""
+        # Shares the lists, whose entries below `size` never change
+        return copy.copy(self)
+
+    def can_append(self, match):
+        # Strictly after: a series built after the match was committed already
+        # ends with it (match ids are unique)
+        return not self.dates or (match.date, match.match_id) > (self.dates[-1], self.match_ids[-1])
+
+    def append(self, match):
+        counters = match_counters(match)
+        self.dates.append(match.date)
+        self.match_ids.append(match.match_id)
+        for field in ADDITIVE_FIELDS:
+            totals = self.prefix[field]
+            totals.append(totals[-1] + counters[field])
+
+        last = self.size
+        for field in MAX_FIELDS:
+            levels = self.sparse[field]
+            levels[0].append(counters[field])
+            # The new match ends one more run of 2**k at every level it fits
+            k = 1
+            while (1 << k) <= last + 1:
+                if len(levels) == k:
+                    levels.append([])
+                half = 1 << (k - 1)
+                levels[k].append(_max(levels[k - 1][last - 2 * half + 1], levels[k - 1][last - half + 1]))
+                k += 1
+        # Published last, so a reader never sees a match with only some fields in
+        self.size = last + 1
+
+    def window(self, start: int, stop: int):
+        """Counters for matches[start:stop], in the rollup column layout."""
+        counters = {field: totals[stop] - totals[start] for field, totals in self.prefix.items()}
+        for field, levels in self.sparse.items():
+            counters[field] = self._range_max(levels, start, stop)
+        if counters["highest_score"] is None:
+            counters["highest_score"] = 0
+        return counters
+
+    def _range_max(self, levels, start: int, stop: int):
+        if stop <= start:
+            return None
+        k = (stop - start).bit_length() - 1
+        return _max(levels[k][start], levels[k][stop - (1 << k)])
+
+    def last(self, matches: int):
+        """Index range of the latest `matches` matches."""
+        return max(len(self) - matches, 0), len(self)
+
+    def between(self, from_date=None, to_date=None):
+        """Index range of the matches dated from_date..to_date, both inclusive."""
+        start = bisect_left(self.dates, from_date, 0, self.size) if from_date is not None else 0
+        stop = bisect_right(self.dates, to_date, 0, self.size) if to_date is not None else self.size
+        return start, max(start, stop)
+
+
+def _max(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a >= b else b
+
+
+# What match_counters() reads, plus the series order
+SERIES_COLUMNS = (
+    "date", "match_id", "came_to_bat", "runs_scored", "balls_faced", "fours", "sixes", "out", "match_result",
+    "balls_bowled", "runs_conceded", "wickets", "catches", "run_outs", "stumpings",
+)
+
+# user_id -> (data version, FormSeries)
+_series_cache = LRUCache(maxsize=settings.form_cache_size, ttl=settings.stats_cache_ttl_seconds)
+_series_lock = threading.Lock()
+
+
+def build_series(db: Session, user_id: int):
+    statement = (
+        select(*(getattr(Match, name) for name in SERIES_COLUMNS))
+        .where(Match.user_id == user_id)
+        .order_by(Match.date, Match.match_id)
+    )
+    series = FormSeries()
+    for row in db.execute(statement):
+        series.append(row)
+    return series
+
+
+def user_series(db: Session, user_id: int):
+    """A snapshot of the user's current series, safe to read while extend_series() appends."""
+    # Read the version before building so a concurrent write can't be cached under it
+    version = data_version(user_id)
+    entry = _series_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1].snapshot()
+    series = build_series(db, user_id)
+    _series_cache.set(user_id, (version, series))
+    return series.snapshot()
+
+
+def extend_series(user_id: int, version: int, match):
+    """Append a newly added match to the cached series, if it is the latest one.
+
+    `version` is the data version the add produced. The cached series is only
+    extended if it was current just before that write; otherwise it is left to
+    be rebuilt. The series is appended to in place; readers hold snapshots.
+    """
+    with _series_lock:
+        entry = _series_cache.get(user_id)
+        if entry is None or entry[0] != version - 1 or not entry[1].can_append(match):
+            return
+        entry[1].append(match)
+        _series_cache.set(user_id, (version, entry[1]))
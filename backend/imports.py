@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+from pydantic import ValidationError
+from .schemas import MatchCreate
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+def detect_format(filename: str, content_type: str):
+    filename = (filename or "").lower()
+    if filename.endswith(".csv") or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def _raw_rows(file, fmt: str):
+    # Yields (row_number, dict) one line at a time so memory stays flat for large files
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(text), start=1):
+                # Empty cells mean "not recorded" so the schema defaults apply
+                yield number, {key: value for key, value in row.items() if key and value not in ("", None)}
+        else:
+            number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, ValueError(f"invalid JSON: {e.msg}")
+    finally:
+        text.detach()
+
+
+def iter_matches(file, fmt: str):
+    """Yield (row_number, MatchCreate or list of error messages) for an upload."""
+    for number, raw in _raw_rows(file, fmt):
+        if isinstance(raw, Exception):
+            yield number, [str(raw)]
+            continue
+        if not isinstance(raw, dict):
+            yield number, ["row must be an object"]
+            continue
+        try:
+            yield number, MatchCreate.model_validate(raw)
+        except ValidationError as e:
+            yield number, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
@@ -0,0 +1,213 @@
+"""Cross-user leaderboards served from precomputed ranking rows.
+
+Every match write marks its user dirty in the transaction that updates their
+rollups. refresh() rewrites the leaderboard_entries rows of dirty users only,
+reading their career and ground rollups plus one grouped query over their
+matches for seasons. Its cost follows the number of users who changed, not the
+number of users. The app runs it every LEADERBOARD_REFRESH_SECONDS, and it can
+be run by hand:
+
+    python -m backend.leaderboards refresh [--all]
+
+Reads never touch `matches`. A board's top K is the first K rows of
+ix_leaderboard_rank, and a user's rank is one plus the number of rows ahead of
+theirs in that index. Tied values share a rank.
+"""
+import anyio
+import argparse
+import logging
+import sys
+from sqlalchemy import extract, func, select
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import Match, User, LeaderboardEntry, LeaderboardDirtyUser
+from .rollups import career_counters, group_counters, to_counters, mark_leaderboard_dirty, all_user_ids
+from .stats import sql_batting_totals, sql_bowling_totals
+
+logger = logging.getLogger("crictracker.leaderboards")
+
+SCOPES = ("all", "ground", "season")
+
+
+class Metric:
+    """How one leaderboard ranks users; value() returns None to leave a user off."""
+
+    def __init__(self, name: str, value, descending: bool = True):
+        self.name = name
+        self.value = value
+        self.descending = descending
+
+
+def _batting_average(counters: dict):
+    if counters["innings"] < settings.leaderboard_min_innings or not counters["dismissals"]:
+        return None
+    return counters["runs_scored"] / counters["dismissals"]
+
+
+def _economy_rate(counters: dict):
+    if counters["balls_bowled"] < settings.leaderboard_min_balls:
+        return None
+    return counters["runs_conceded"] / counters["balls_bowled"] * 6
+
+
+METRICS = {metric.name: metric for metric in (
+    Metric("most_runs", lambda counters: counters["runs_scored"] or None),
+    Metric("best_average", _batting_average),
+    Metric("best_economy", _economy_rate, descending=False),
+    Metric("most_five_fers", lambda counters: counters["five_fers"] or None),
+)}
+
+
+def user_scopes(db: Session, user_id: int):
+    """(scope, scope_key, counters) for every board the user can appear on."""
+    career = career_counters(db, user_id)
+    if career["matches"]:
+        yield "all", "", career
+    for ground, counters in group_counters(db, user_id, "ground"):
+        yield "ground", ground, counters
+
+    season = extract("year", Match.date)
+    bowling = dict(sql_bowling_totals(db, user_id, group_by=season))
+    for year, batting in sql_batting_totals(db, user_id, group_by=season):
+        if year is not None:
+            yield "season", str(year), to_counters(batting, bowling[year])
+
+
+def user_entries(db: Session, user_id: int):
+    entries = []
+    for scope, scope_key, counters in user_scopes(db, user_id):
+        for metric in METRICS.values():
+            value = metric.value(counters)
+            if value is not None:
+                entries.append(LeaderboardEntry(
+                    metric=metric.name, scope=scope, scope_key=scope_key,
+                    user_id=user_id, value=value, matches=counters["matches"],
+                ))
+    return entries
+
+
+def refresh_users(db: Session, user_ids):
+    """Replace these users' leaderboard entries with ones computed from their current stats."""
+    db.query(LeaderboardEntry).filter(LeaderboardEntry.user_id.in_(user_ids)).delete(synchronize_session=False)
+    for user_id in user_ids:
+        db.add_all(user_entries(db, user_id))
+
+
+def refresh(db: Session, batch_size: int = None):
+    """Refresh up to `batch_size` dirty users and commit; returns how many were refreshed."""
+    # SKIP LOCKED lets several workers refresh at once without taking the same users
+    dirty = db.execute(
+        select(LeaderboardDirtyUser.user_id, LeaderboardDirtyUser.marked_at)
+        .order_by(LeaderboardDirtyUser.marked_at)
+        .limit(batch_size or settings.leaderboard_refresh_batch)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not dirty:
+        return 0
+
+    refresh_users(db, [user_id for user_id, _ in dirty])
+    for user_id, marked_at in dirty:
+        # A user written to since we read the queue keeps their mark for the next pass
+        db.query(LeaderboardDirtyUser).filter(
+            LeaderboardDirtyUser.user_id == user_id,
+            LeaderboardDirtyUser.marked_at == marked_at,
+        ).delete(synchronize_session=False)
+    db.commit()
+    return len(dirty)
+
+
+def refresh_all(db: Session):
+    total = 0
+    while True:
+        refreshed = refresh(db)
+        if not refreshed:
+            return total
+        total += refreshed
+
+
+def _refresh_pending():
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return refresh_all(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically(interval: float):
+    """Refresh dirty users every `interval` seconds, off the event loop, until cancelled."""
+    while True:
+        await anyio.sleep(interval)
+        try:
+            await anyio.to_thread.run_sync(_refresh_pending)
+        except Exception:
+            # Users stay marked, so the next pass retries them
+            logger.exception("Leaderboard refresh failed")
+
+
+def _board(metric: Metric, scope: str, scope_key: str):
+    return (
+        LeaderboardEntry.metric == metric.name,
+        LeaderboardEntry.scope == scope,
+        LeaderboardEntry.scope_key == scope_key,
+    )
+
+
+def top_entries(db: Session, metric: Metric, scope: str, scope_key: str, limit: int):
+    """The board's first `limit` rows as (rank, entry, username)."""
+    # Ties break on user_id in the same direction, so both sort keys come from the index
+    order = (LeaderboardEntry.value, LeaderboardEntry.user_id)
+    if metric.descending:
+        order = tuple(column.desc() for column in order)
+    rows = (
+        db.query(LeaderboardEntry, User.username)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .filter(*_board(metric, scope, scope_key))
+        .order_by(*order)
+        .limit(limit)
+        .all()
+    )
+    ranked, previous = [], None
+    for position, (entry, username) in enumerate(rows, start=1):
+        rank = previous[0] if previous is not None and previous[1] == entry.value else position
+        ranked.append((rank, entry, username))
+        previous = (rank, entry.value)
+    return ranked
+
+
+def user_rank(db: Session, metric: Metric, scope: str, scope_key: str, user_id: int):
+    """(rank, entry) for the user on this board, or None if they aren't on it."""
+    entry = db.get(LeaderboardEntry, (metric.name, scope, scope_key, user_id))
+    if entry is None:
+        return None
+    ahead = LeaderboardEntry.value > entry.value if metric.descending else LeaderboardEntry.value < entry.value
+    count = db.scalar(select(func.count()).select_from(LeaderboardEntry).where(*_board(metric, scope, scope_key), ahead))
+    return count + 1, entry
+
+
+def board_size(db: Session, metric: Metric, scope: str, scope_key: str):
+    return db.scalar(select(func.count()).select_from(LeaderboardEntry).where(*_board(metric, scope, scope_key)))
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Refresh the leaderboard ranking tables")
+    parser.add_argument("command", choices=["refresh"])
+    parser.add_argument("--all", action="store_true", help="recompute every user, not just the dirty ones")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.all:
+            mark_leaderboard_dirty(db, all_user_ids(db))
+            db.commit()
+        print(f"{refresh_all(db)} users refreshed")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
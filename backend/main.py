@@ -1,14 +1,28 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from .database import Base, engine
-from .models import User, Match                  # necessary to import here for creating tables
+import asyncio
+import math
+from anyio import to_thread
+from .config import settings
+from .assets import AssetStaticFiles, asset_url, asset_srcset
+from .compression import CompressionMiddleware
+from .database import Base, engine, read_engine, async_engine, pool_stats
+from .cache import stats_cache
+from .leaderboards import refresh_periodically
+from .metrics import RequestMetricsMiddleware, instrument, render_prometheus
+from .utils import PasswordHasherBusy, password_hasher
+from .ratelimit import RateLimited
+from .models import User, Match, Season, BallChunk, PlayerCareerStats, PlayerGroupStats, PlayerSeasonStats, LeaderboardEntry, LeaderboardDirtyUser  # necessary to import here for creating tables
 from .api.users import user_router
 from .api.matches import match_router
 from .api.bat_stats import batsman_router
 from .api.ball_stats import bowler_router
+from .api.form import form_router
+from .api.leaderboards import leaderboard_router
+from .api.dashboard import dashboard_router
+from .api.seasons import season_router
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -18,8 +32,47 @@ app = FastAPI(
     description="A cricket statistics tracking API",
     version="1.0.0",
 )
-app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Sync (def) routes run on this pool; size it to the DB pool rather than anyio's default of 40
+    to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+
+@app.on_event("startup")
+async def start_leaderboard_refresh():
+    app.state.leaderboard_refresh = None
+    if settings.leaderboard_refresh_seconds > 0:
+        app.state.leaderboard_refresh = asyncio.create_task(refresh_periodically(settings.leaderboard_refresh_seconds))
+
+@app.on_event("shutdown")
+async def stop_leaderboard_refresh():
+    if app.state.leaderboard_refresh is not None:
+        app.state.leaderboard_refresh.cancel()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts in progress, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RateLimited)
+async def rate_limited(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many attempts, please retry later"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+app.mount("/static", AssetStaticFiles(directory="frontend/static"), name="static")
 templates = Jinja2Templates(directory="frontend/templates")
+templates.env.globals["asset_url"] = asset_url
+templates.env.globals["asset_srcset"] = asset_srcset
 
 # Set up CORS
 app.add_middleware(
@@ -30,11 +83,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.gzip_level,
+    brotli_quality=settings.brotli_quality,
+)
+
+# Per-request query counts and timings; added last so it wraps everything else
+instrument(engine, read_engine, async_engine.sync_engine)
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include API router
 app.include_router(user_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(match_router, prefix="/api/v1/matches", tags=["matches"])
 app.include_router(batsman_router, prefix="/api/v1/bat_stats", tags=["batting_stats"])
 app.include_router(bowler_router, prefix="/api/v1/ball_stats", tags=["bowling_stats"])
+app.include_router(form_router, prefix="/api/v1/form", tags=["form"])
+app.include_router(leaderboard_router, prefix="/api/v1/leaderboards", tags=["leaderboards"])
+app.include_router(dashboard_router, prefix="/api/v1/dashboard", tags=["dashboard"])
+app.include_router(season_router, prefix="/api/v1/seasons", tags=["seasons"])
   
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -54,4 +122,20 @@ async def dashboard_page(request: Request):
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/details")
+async def health_details():
+    return {"status": "healthy", "db_pools": pool_stats(), "password_hasher": password_hasher.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    gauges = {
+        "stats_cache_entries": len(stats_cache),
+        "password_hasher": {(("stat", name),): value for name, value in password_hasher.stats().items()},
+        "db_pool": {
+            (("pool", pool), ("stat", name)): value
+            for pool, stats in pool_stats().items() for name, value in stats.items()
+        },
+    }
+    return PlainTextResponse(render_prometheus(gauges), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,331 @@
+"""Per-request query counting, timing and profiling.
+
+RequestMetricsMiddleware starts a RequestMetrics for every HTTP request and
+publishes it through a context variable. SQLAlchemy engine events charge each
+statement to the current request. FastAPI runs sync routes and dependencies in
+a copy of the request's context, so the events fire with the right request
+even on worker threads. Routers built with route_class=MeteredRoute also
+charge their sync handlers' CPU time to the request, as the password hasher
+does for its bcrypt jobs. Each request's numbers are:
+
+- sent back as a Server-Timing header,
+- optionally logged as one JSON line (REQUEST_LOG=true),
+- added to the process-wide totals rendered by render_prometheus() for /metrics.
+
+With PROFILE_SLOW_REQUESTS_MS set, a sampling profiler records stacks while
+requests are in flight and logs the hottest ones for any request slower than
+that.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from .config import settings
+
+logger = logging.getLogger("crictracker.requests")
+if settings.request_log:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_TOP_STACKS = 15
+PROFILE_MAX_DEPTH = 64
+
+
+class RequestMetrics:
+    """What one request cost: DB statements, DB time, rows and CPU time."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        # Charged by charge_thread_cpu() callables, from their own thread's clock
+        self.cpu_seconds = 0.0
+
+    def record_query(self, seconds: float, rows: int):
+        self.queries += 1
+        self.db_seconds += seconds
+        if rows > 0:
+            self.rows += rows
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return (
+            f'db;desc="{self.queries} queries, {self.rows} rows";dur={self.db_seconds * 1000:.2f}, '
+            f"cpu;dur={self.cpu_seconds * 1000:.2f}, "
+            f"app;dur={self.elapsed * 1000:.2f}"
+        )
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    metrics = _current.get()
+    if metrics is not None:
+        # Drivers report affected rows for writes; psycopg2 and asyncpg also report
+        # SELECT rows, SQLite doesn't (-1)
+        metrics.record_query(time.perf_counter() - started, cursor.rowcount)
+
+
+def charge_thread_cpu(call):
+    """Wrap a sync callable to charge the CPU time of its own thread to the
+    current request, so requests running alongside it don't inflate the figure.
+    Meant for callables run on a worker thread in a copy of the request's context."""
+    @functools.wraps(call)
+    def timed(*args, **kwargs):
+        started = time.thread_time()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.cpu_seconds += time.thread_time() - started
+    timed.charges_cpu = True
+    return timed
+
+
+class MeteredRoute(APIRoute):
+    """Route whose sync handler charges its worker thread's CPU time to the request.
+
+    Async handlers share the event loop thread with every other request, so
+    their own CPU isn't timed (bcrypt jobs they hand to the password hasher
+    are). Neither are bodies streamed after the handler returns.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        # include_router() builds a second route from this one's endpoint, which
+        # is already wrapped
+        if not asyncio.iscoroutinefunction(endpoint) and not getattr(endpoint, "charges_cpu", False):
+            endpoint = charge_thread_cpu(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def instrument(*engines):
+    """Charge statements on these (sync) engines to the current request."""
+    for engine in {id(engine): engine for engine in engines}.values():
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class _RouteTotals:
+    def __init__(self):
+        self.requests = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.cpu_seconds = 0.0
+
+
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def _record_totals(method: str, route: str, status: int, metrics: RequestMetrics, elapsed: float, cpu_seconds: float):
+    with _totals_lock:
+        totals = _totals.get((method, route, status))
+        if totals is None:
+            totals = _totals[(method, route, status)] = _RouteTotals()
+        totals.requests += 1
+        totals.duration_sum += elapsed
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if elapsed <= bound:
+                totals.buckets[i] += 1
+        totals.queries += metrics.queries
+        totals.db_seconds += metrics.db_seconds
+        totals.rows += metrics.rows
+        totals.cpu_seconds += cpu_seconds
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus(gauges: dict = None):
+    """Request totals in the Prometheus text format, plus any extra `gauges`.
+
+    `gauges` maps a metric name to {label tuple: value} or to a single value.
+    """
+    with _totals_lock:
+        snapshot = sorted(_totals.items())
+        rows = [(key, totals.__dict__.copy(), list(totals.buckets)) for key, totals in snapshot]
+
+    lines = [
+        "# HELP http_request_duration_seconds Time from receiving a request to finishing its response.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status), totals, buckets in rows:
+        for bound, count in zip(DURATION_BUCKETS, buckets):
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, status=status, le=bound)} {count}")
+        lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, status=status, le='+Inf')} {totals['requests']}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route, status=status)} {totals['duration_sum']:.6f}")
+        lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route, status=status)} {totals['requests']}")
+
+    for name, field, help_text in (
+        ("http_request_db_queries_total", "queries", "SQL statements executed while serving requests."),
+        ("http_request_db_seconds_total", "db_seconds", "Time spent executing SQL while serving requests."),
+        ("http_request_db_rows_total", "rows", "Rows reported by the database driver while serving requests."),
+        ("http_request_cpu_seconds_total", "cpu_seconds", "CPU time of sync route handlers and password hashing on their worker threads."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route, status), totals, _ in rows:
+            lines.append(f"{name}{_labels(method=method, route=route, status=status)} {totals[field]}")
+
+    for name, values in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(values, dict):
+            for labels, value in values.items():
+                lines.append(f"{name}{_labels(**dict(labels))} {value}")
+        else:
+            lines.append(f"{name} {values}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Samples every busy thread's stack while profiled requests are in flight.
+
+    Stacks can't be tied to a request, so a request's profile holds whatever the
+    process was doing while it ran; overlapping requests share samples.
+    """
+
+    # A thread whose current frame is in one of these is parked, not working
+    IDLE_FILES = tuple(os.sep + name for name in ("threading.py", "queue.py", "selectors.py", "thread.py"))
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, metrics: RequestMetrics):
+        with self._lock:
+            self._active[id(metrics)] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, metrics: RequestMetrics):
+        with self._lock:
+            return self._active.pop(id(metrics), Counter())
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+            self._wake.wait()
+            time.sleep(self.interval)
+            stacks = [self._fold(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            stacks = [stack for stack in stacks if stack]
+            with self._lock:
+                for counter in self._active.values():
+                    counter.update(stacks)
+
+    def _fold(self, frame):
+        # Root-to-leaf "file:function:line" frames, joined like flamegraph input
+        if frame.f_code.co_filename.endswith(self.IDLE_FILES):
+            return None
+        parts = []
+        while frame is not None and len(parts) < PROFILE_MAX_DEPTH:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+
+profiler = SamplingProfiler(settings.profile_interval_ms / 1000) if settings.profile_slow_requests_ms else None
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware that measures each HTTP request (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        if profiler is not None:
+            profiler.start(metrics)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Streamed bodies keep querying after this point; those statements
+                # only show up in the log and /metrics
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", metrics.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed, cpu_seconds = metrics.elapsed, metrics.cpu_seconds
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            _record_totals(scope["method"], route, status_code, metrics, elapsed, cpu_seconds)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "db_queries": metrics.queries,
+                    "db_ms": round(metrics.db_seconds * 1000, 2),
+                    "db_rows": metrics.rows,
+                    "cpu_ms": round(cpu_seconds * 1000, 2),
+                }))
+            if profiler is not None:
+                samples = profiler.stop(metrics)
+                if elapsed * 1000 >= settings.profile_slow_requests_ms:
+                    logger.warning(json.dumps({
+                        "event": "slow_request_profile",
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "samples": sum(samples.values()),
+                        "stacks": [{"stack": stack, "count": count} for stack, count in samples.most_common(PROFILE_TOP_STACKS)],
+                    }))
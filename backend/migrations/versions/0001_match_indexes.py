@@ -0,0 +1,50 @@
+"""Composite indexes on matches for the per-user query patterns
+
+Tables are still created by Base.metadata.create_all() at startup, which also
+creates these indexes on a fresh database; this brings existing databases in
+line. Index creation is IF NOT EXISTS so it is safe to run on either.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_matches_user_date": ["user_id", "date", "match_id"],
+    "ix_matches_user_ground": ["user_id", "ground"],
+    "ix_matches_user_match_inning": ["user_id", "match_inning"],
+    "ix_matches_user_match_result": ["user_id", "match_result"],
+    "ix_matches_user_batting_position": ["user_id", "batting_position"],
+}
+
+TOTALS_INCLUDE = [
+    "ground", "match_inning", "match_result", "batting_position", "came_to_bat",
+    "runs_scored", "balls_faced", "fours", "sixes", "out",
+    "overs_bowled", "runs_conceded", "wickets", "catches", "run_outs", "stumpings",
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "matches", columns, if_not_exists=True)
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_index("ix_matches_user_totals", "matches", ["user_id"], postgresql_include=TOTALS_INCLUDE, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_matches_user_totals", table_name="matches")
+    for name in reversed(INDEXES):
+        op.drop_index(name, table_name="matches")
@@ -0,0 +1,61 @@
+"""Store bowling workload as integer balls_bowled next to overs_bowled
+
+overs_bowled keeps the cricket notation users enter (4.3 = 4 overs 3 balls);
+balls_bowled holds the same amount in balls so the database can SUM it
+exactly. Existing rows are backfilled with the conversion the stats code used.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TOTALS_INCLUDE = [
+    "ground", "match_inning", "match_result", "batting_position", "came_to_bat",
+    "runs_scored", "balls_faced", "fours", "sixes", "out",
+    "balls_bowled", "runs_conceded", "wickets", "catches", "run_outs", "stumpings",
+]
+OLD_TOTALS_INCLUDE = [name if name != "balls_bowled" else "overs_bowled" for name in TOTALS_INCLUDE]
+
+BACKFILL = """
+UPDATE matches
+SET balls_bowled = CAST(ROUND(overs_bowled * 10) AS INTEGER) - 4 * (CAST(ROUND(overs_bowled * 10) AS INTEGER) / 10)
+WHERE overs_bowled IS NOT NULL AND balls_bowled IS NULL
+"""
+
+
+def _has_column(table: str, column: str):
+    # create_all() already adds the column on databases created after this change
+    if context.is_offline_mode():
+        return False
+    return column in {info["name"] for info in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _replace_totals_index(include):
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_matches_user_totals", table_name="matches", if_exists=True)
+        op.create_index("ix_matches_user_totals", "matches", ["user_id"], postgresql_include=include)
+
+
+def upgrade() -> None:
+    if not _has_column("matches", "balls_bowled"):
+        op.add_column("matches", sa.Column("balls_bowled", sa.Integer(), nullable=True))
+    op.execute(BACKFILL)
+    _replace_totals_index(TOTALS_INCLUDE)
+
+
+def downgrade() -> None:
+    _replace_totals_index(OLD_TOTALS_INCLUDE)
+    with op.batch_alter_table("matches") as batch_op:
+        batch_op.drop_column("balls_bowled")
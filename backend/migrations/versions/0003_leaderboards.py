@@ -0,0 +1,65 @@
+"""Leaderboard ranking tables and the queue of users to refresh
+
+leaderboard_entries holds each user's value per metric and scope, indexed in
+ranking order. leaderboard_dirty_users lists users whose entries are out of
+date; every user with matches starts on it, so the first refresh fills the
+boards.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MARK_EVERY_USER = """
+INSERT INTO leaderboard_dirty_users (user_id, marked_at)
+SELECT DISTINCT user_id, CURRENT_TIMESTAMP FROM matches
+WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT user_id FROM leaderboard_dirty_users)
+"""
+
+
+def _has_table(table: str):
+    # create_all() already makes the tables on databases created after this change
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if not _has_table("leaderboard_entries"):
+        op.create_table(
+            "leaderboard_entries",
+            sa.Column("metric", sa.String(), primary_key=True),
+            sa.Column("scope", sa.String(), primary_key=True),
+            sa.Column("scope_key", sa.String(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("value", sa.Float(), nullable=False),
+            sa.Column("matches", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_leaderboard_rank", "leaderboard_entries", ["metric", "scope", "scope_key", "value", "user_id"])
+        op.create_index("ix_leaderboard_user", "leaderboard_entries", ["user_id"])
+    if not _has_table("leaderboard_dirty_users"):
+        op.create_table(
+            "leaderboard_dirty_users",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("marked_at", sa.DateTime(), nullable=False),
+        )
+    op.execute(MARK_EVERY_USER)
+
+
+def downgrade() -> None:
+    op.drop_table("leaderboard_dirty_users")
+    op.drop_index("ix_leaderboard_user", table_name="leaderboard_entries")
+    op.drop_index("ix_leaderboard_rank", table_name="leaderboard_entries")
+    op.drop_table("leaderboard_entries")
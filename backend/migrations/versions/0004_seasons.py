@@ -0,0 +1,163 @@
+"""Seasons, matches.season_id, and yearly partitions of matches on Postgres
+
+Adds the seasons table and the nullable matches.season_id with its index;
+player_season_stats is created by create_all() like the other rollup tables.
+
+On Postgres, matches becomes a table partitioned by RANGE (date). It gets one
+partition per year that has matches, plus this year and next, and a default
+partition for anything later. The rows are copied across. A partitioned table's
+primary key must include the partition column, so it becomes
+(match_id, date); match_id still comes from the same sequence and stays
+unique. Run `python -m backend.seasons partitions` yearly to add the coming
+years. SQLite keeps a plain table.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEQUENCE = "matches_match_id_seq"
+OLD_TABLE = "matches_unpartitioned"
+
+INDEXES = {
+    "ix_matches_match_id": ["match_id"],
+    "ix_matches_user_date": ["user_id", "date", "match_id"],
+    "ix_matches_user_ground": ["user_id", "ground"],
+    "ix_matches_user_match_inning": ["user_id", "match_inning"],
+    "ix_matches_user_match_result": ["user_id", "match_result"],
+    "ix_matches_user_batting_position": ["user_id", "batting_position"],
+    "ix_matches_user_season": ["user_id", "season_id", "date"],
+}
+
+TOTALS_INCLUDE = [
+    "ground", "match_inning", "match_result", "batting_position", "came_to_bat",
+    "runs_scored", "balls_faced", "fours", "sixes", "out",
+    "balls_bowled", "runs_conceded", "wickets", "catches", "run_outs", "stumpings",
+]
+
+
+def _has_table(table: str):
+    # create_all() already makes the tables on databases created after this change
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def _has_column(table: str, column: str):
+    if context.is_offline_mode():
+        return False
+    return column in {info["name"] for info in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _is_partitioned():
+    if context.is_offline_mode():
+        return False
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('matches')"
+    )).first() is not None
+
+
+def _create_match_indexes():
+    for name, columns in INDEXES.items():
+        op.create_index(name, "matches", columns)
+    op.create_index("ix_matches_user_totals", "matches", ["user_id"], postgresql_include=TOTALS_INCLUDE)
+    op.create_foreign_key("matches_user_id_fkey", "matches", "users", ["user_id"], ["id"])
+    op.create_foreign_key("matches_season_id_fkey", "matches", "seasons", ["season_id"], ["season_id"])
+
+
+def _swap_matches(create_new_table):
+    """Rebuild matches from a renamed copy: create_new_table() makes the empty
+    replacement, then the rows, sequence, indexes and foreign keys move over."""
+    op.execute(f"ALTER TABLE matches RENAME TO {OLD_TABLE}")
+    op.execute(f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT matches_pkey TO {OLD_TABLE}_pkey")
+    create_new_table()
+    op.execute(f"INSERT INTO matches SELECT * FROM {OLD_TABLE}")
+    # Dropping the old table would drop the sequence it owns
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY NONE")
+    op.execute(f"DROP TABLE {OLD_TABLE}")
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY matches.match_id")
+    _create_match_indexes()
+
+
+def _partition_matches():
+    this_year = date.today().year
+    years = {this_year, this_year + 1}
+    if not context.is_offline_mode():
+        years |= {int(year) for (year,) in op.get_bind().execute(sa.text(
+            "SELECT DISTINCT CAST(EXTRACT(YEAR FROM date) AS INTEGER) FROM matches"))}
+
+    def create_partitioned():
+        op.execute(
+            f"CREATE TABLE matches (LIKE {OLD_TABLE} INCLUDING DEFAULTS, PRIMARY KEY (match_id, date)) "
+            "PARTITION BY RANGE (date)"
+        )
+        for year in sorted(years):
+            op.execute(
+                f"CREATE TABLE matches_y{year} PARTITION OF matches "
+                f"FOR VALUES FROM ('{date(year, 1, 1)}') TO ('{date(year + 1, 1, 1)}')"
+            )
+        op.execute("CREATE TABLE matches_default PARTITION OF matches DEFAULT")
+
+    _swap_matches(create_partitioned)
+
+
+def _unpartition_matches():
+    def create_plain():
+        op.execute(f"CREATE TABLE matches (LIKE {OLD_TABLE} INCLUDING DEFAULTS, PRIMARY KEY (match_id))")
+
+    _swap_matches(create_plain)
+
+
+def upgrade() -> None:
+    if not _has_table("seasons"):
+        op.create_table(
+            "seasons",
+            sa.Column("season_id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("kind", sa.Enum("SEASON", "TOURNAMENT", name="seasonkind"), nullable=False),
+            sa.Column("start_date", sa.Date(), nullable=False),
+            sa.Column("end_date", sa.Date(), nullable=False),
+            sa.Column("closed_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("user_id", "name", name="uq_seasons_user_name"),
+        )
+        op.create_index("ix_seasons_season_id", "seasons", ["season_id"])
+    if not _has_column("matches", "season_id"):
+        # Postgres gets the foreign key when matches is rebuilt below; SQLite
+        # can't add one to an existing table
+        op.add_column("matches", sa.Column("season_id", sa.Integer(), nullable=True))
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index("ix_matches_user_season", "matches", ["user_id", "season_id", "date"], if_not_exists=True)
+    elif not _is_partitioned():
+        # Recreates every index and foreign key, ix_matches_user_season included
+        _partition_matches()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql" and _is_partitioned():
+        _unpartition_matches()
+    op.drop_index("ix_matches_user_season", table_name="matches")
+    with op.batch_alter_table("matches") as batch_op:
+        if op.get_bind().dialect.name == "postgresql":
+            batch_op.drop_constraint("matches_season_id_fkey", type_="foreignkey")
+        batch_op.drop_column("season_id")
+    if _has_table("player_season_stats"):
+        op.drop_table("player_season_stats")
+    op.drop_index("ix_seasons_season_id", table_name="seasons")
+    op.drop_table("seasons")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TYPE IF EXISTS seasonkind")
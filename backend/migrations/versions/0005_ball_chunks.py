@@ -0,0 +1,44 @@
+"""Ball-by-ball event chunks
+
+ball_chunks holds each match's events packed two bytes per ball (see
+backend/balls.py). It has no foreign key to matches, whose primary key is
+(match_id, date) once partitioned on Postgres; match deletes remove the
+chunks themselves.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str):
+    # create_all() already makes the table on databases created after this change
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if not _has_table("ball_chunks"):
+        op.create_table(
+            "ball_chunks",
+            sa.Column("match_id", sa.Integer(), primary_key=True),
+            sa.Column("chunk_no", sa.Integer(), primary_key=True),
+            sa.Column("codes", sa.LargeBinary(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("ball_chunks")
@@ -0,0 +1,131 @@
+"""Backfill the stats rollups for matches written before they existed
+
+The rollup tables were added without building rows for existing matches.
+This rebuilds every user's career and group rows from `matches`, as
+`python -m backend.rollups rebuild` does, and queues the users for a
+leaderboard refresh. The rows are derived data, so it is safe to run again.
+
+The tables and aggregates are spelled out here as they are at this revision,
+rather than taken from backend.models and backend.stats, so that later changes
+to those don't change what this migration does.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rollup column -> its aggregate over a user's matches (stats.batting_totals_columns()
+# and bowling_totals_columns()); enums are stored by name, best_bowling is
+# wickets * 1000 - runs
+AGGREGATES = {
+    "matches": "COUNT(match_id)",
+    "innings": "COUNT(CASE WHEN came_to_bat = 'YES' THEN 1 END)",
+    "runs_scored": "COALESCE(SUM(runs_scored), 0)",
+    "balls_faced": "COALESCE(SUM(balls_faced), 0)",
+    "fours": "COALESCE(SUM(fours), 0)",
+    "sixes": "COALESCE(SUM(sixes), 0)",
+    "highest_score": "COALESCE(MAX(runs_scored), 0)",
+    "dismissals": "COUNT(CASE WHEN \"out\" = 'YES' THEN 1 END)",
+    "ducks": "COUNT(CASE WHEN \"out\" = 'YES' AND runs_scored = 0 THEN 1 END)",
+    "thirties": "COUNT(CASE WHEN runs_scored > 29 AND runs_scored < 50 THEN 1 END)",
+    "fifties": "COUNT(CASE WHEN runs_scored > 49 AND runs_scored < 100 THEN 1 END)",
+    "hundreds": "COUNT(CASE WHEN runs_scored > 99 THEN 1 END)",
+    "thirties_plus": "COUNT(CASE WHEN runs_scored > 29 THEN 1 END)",
+    "matches_won": "COUNT(CASE WHEN match_result = 'WON' THEN 1 END)",
+    "bowling_innings": "COUNT(CASE WHEN balls_bowled > 0 THEN 1 END)",
+    "balls_bowled": "COALESCE(SUM(balls_bowled), 0)",
+    "runs_conceded": "COALESCE(SUM(runs_conceded), 0)",
+    "wickets_taken": "COALESCE(SUM(wickets), 0)",
+    "three_fers": "COUNT(CASE WHEN wickets > 2 AND wickets < 5 THEN 1 END)",
+    "five_fers": "COUNT(CASE WHEN wickets > 4 THEN 1 END)",
+    "best_bowling": "MAX(CASE WHEN wickets > 0 THEN wickets * 1000 - runs_conceded END)",
+    "catches": "COALESCE(SUM(catches), 0)",
+    "runouts": "COALESCE(SUM(run_outs), 0)",
+    "stumpings": "COALESCE(SUM(stumpings), 0)",
+}
+
+# Breakdown dimension -> its group_key: the column's value as text, which for
+# the enums is the lower-cased name
+GROUP_KEYS = {
+    "ground": "ground",
+    "match_inning": "LOWER(CAST(match_inning AS VARCHAR))",
+    "match_result": "LOWER(CAST(match_result AS VARCHAR))",
+    "batting_position": "CAST(batting_position AS VARCHAR)",
+}
+
+COLUMNS = ", ".join(AGGREGATES)
+SELECTED = ", ".join(AGGREGATES.values())
+
+BUILD_CAREER = f"""
+INSERT INTO player_career_stats (user_id, {COLUMNS}, updated_at)
+SELECT user_id, {SELECTED}, CURRENT_TIMESTAMP FROM matches
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+"""
+
+BUILD_GROUPS = """
+INSERT INTO player_group_stats (user_id, dimension, group_key, {columns}, updated_at)
+SELECT user_id, '{dimension}', {key}, {selected}, CURRENT_TIMESTAMP FROM matches
+WHERE user_id IS NOT NULL AND {dimension} IS NOT NULL
+GROUP BY user_id, {dimension}
+"""
+
+MARK_EVERY_USER = """
+INSERT INTO leaderboard_dirty_users (user_id, marked_at)
+SELECT DISTINCT user_id, CURRENT_TIMESTAMP FROM matches
+WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT user_id FROM leaderboard_dirty_users)
+"""
+
+
+def _has_table(table: str):
+    # create_all() already makes the tables on databases created after the rollups
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def _counter_columns():
+    return [sa.Column(name, sa.Integer(), nullable=name == "best_bowling") for name in AGGREGATES] + [
+        sa.Column("updated_at", sa.DateTime()),
+    ]
+
+
+def upgrade() -> None:
+    if not _has_table("player_career_stats"):
+        op.create_table(
+            "player_career_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            *_counter_columns(),
+        )
+    if not _has_table("player_group_stats"):
+        op.create_table(
+            "player_group_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("dimension", sa.String(), primary_key=True),
+            sa.Column("group_key", sa.String(), primary_key=True),
+            *_counter_columns(),
+        )
+
+    op.execute("DELETE FROM player_group_stats")
+    op.execute("DELETE FROM player_career_stats")
+    op.execute(BUILD_CAREER)
+    for dimension, key in GROUP_KEYS.items():
+        op.execute(BUILD_GROUPS.format(columns=COLUMNS, dimension=dimension, key=key, selected=SELECTED))
+    op.execute(MARK_EVERY_USER)
+
+
+def downgrade() -> None:
+    # The rows are derived data; the rollups keep working without them
+    pass
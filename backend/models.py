@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Date, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Date, Enum, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -18,6 +18,35 @@ class YesorNo(enum.Enum):
     YES = "yes"
     NO = "no"
 
+# Ball-by-ball events. Only the member order matters to storage: events are
+# packed as each value's position (see backend/balls.py), so append new
+# members at the end and never reorder
+class BallRole(enum.Enum):
+    BATTING = "batting"      # a ball the user faced
+    BOWLING = "bowling"      # a ball the user bowled
+    FIELDING = "fielding"    # a dismissal the user took part in as a fielder
+
+class ExtraType(enum.Enum):
+    NONE = "none"
+    WIDE = "wide"
+    NO_BALL = "no_ball"
+    BYE = "bye"
+    LEG_BYE = "leg_bye"
+
+class DismissalType(enum.Enum):
+    NONE = "none"
+    BOWLED = "bowled"
+    CAUGHT = "caught"
+    LBW = "lbw"
+    RUN_OUT = "run_out"
+    STUMPED = "stumped"
+    HIT_WICKET = "hit_wicket"
+    OTHER = "other"
+
+class SeasonKind(enum.Enum):
+    SEASON = "season"
+    TOURNAMENT = "tournament"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -31,6 +60,26 @@ class User(Base):
 
     match = relationship("Match", back_populates="user")
 
+class Season(Base):
+    __tablename__ = "seasons"
+
+    # A user's season or tournament. Its matches must fall between start_date
+    # and end_date, which lets season queries also filter on date (and so
+    # prune year partitions on Postgres). A closed season's stats are frozen
+    # into player_season_stats and its matches can't change until reopened.
+    season_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String, nullable=False)
+    kind = Column(Enum(SeasonKind), nullable=False, default=SeasonKind.SEASON)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    closed_at = Column(DateTime, nullable=True)    # set while the season is closed
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_seasons_user_name"),
+    )
+
 class Match(Base):
     __tablename__ = "matches"
     
@@ -51,15 +100,128 @@ class Match(Base):
     catches = Column(Integer, default=0)
     run_outs = Column(Integer, default=0)
     stumpings = Column(Integer, default=0)
-    overs_bowled = Column(Float, nullable=True)
+    overs_bowled = Column(Float, nullable=True)    # cricket notation, 4.3 = 4 overs 3 balls
+    balls_bowled = Column(Integer, nullable=True)  # the same in balls; what stats sum
     runs_conceded = Column(Integer, nullable=True)
     wickets = Column(Integer, nullable=True)
     wides = Column(Integer, nullable=True)
     no_balls = Column(Integer, nullable=True)
 
     match_result = Column(Enum(MatchResult))
+    season_id = Column(Integer, ForeignKey("seasons.season_id"), nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, nullable=True, onupdate=datetime.utcnow)
 
-    user = relationship("User", back_populates="match")
\ No newline at end of file
+    user = relationship("User", back_populates="match")
+
+    # Every query is scoped to one user, so user_id leads each index. The second
+    # column serves the listing order (keyset pages, export) or one breakdown.
+    # Keep in step with the migrations in backend/migrations.
+    __table_args__ = (
+        Index("ix_matches_user_date", "user_id", "date", "match_id"),
+        Index("ix_matches_user_ground", "user_id", "ground"),
+        Index("ix_matches_user_match_inning", "user_id", "match_inning"),
+        Index("ix_matches_user_match_result", "user_id", "match_result"),
+        Index("ix_matches_user_batting_position", "user_id", "batting_position"),
+        Index("ix_matches_user_season", "user_id", "season_id", "date"),
+        # Carries every column the stats aggregates read, so on Postgres career
+        # and breakdown totals are index-only scans
+        Index("ix_matches_user_totals", "user_id", postgresql_include=[
+            "ground", "match_inning", "match_result", "batting_position", "came_to_bat",
+            "runs_scored", "balls_faced", "fours", "sixes", "out",
+            "balls_bowled", "runs_conceded", "wickets", "catches", "run_outs", "stumpings",
+        ]).ddl_if(dialect="postgresql"),
+    )
+
+class BallChunk(Base):
+    __tablename__ = "ball_chunks"
+
+    # A match's ball-by-ball events, packed two bytes per ball and cut into
+    # chunks of balls.CHUNK_BALLS; only the last chunk of a match is ever
+    # appended to. No foreign key: matches' primary key is (match_id, date)
+    # on partitioned Postgres, so match deletes remove the chunks explicitly.
+    match_id = Column(Integer, primary_key=True)
+    chunk_no = Column(Integer, primary_key=True)
+    codes = Column(LargeBinary, nullable=False)
+
+class StatsCounters:
+    """Running batting/bowling totals shared by the per-user rollup tables."""
+
+    matches = Column(Integer, nullable=False, default=0)
+
+    innings = Column(Integer, nullable=False, default=0)
+    runs_scored = Column(Integer, nullable=False, default=0)
+    balls_faced = Column(Integer, nullable=False, default=0)
+    fours = Column(Integer, nullable=False, default=0)
+    sixes = Column(Integer, nullable=False, default=0)
+    highest_score = Column(Integer, nullable=False, default=0)
+    dismissals = Column(Integer, nullable=False, default=0)
+    ducks = Column(Integer, nullable=False, default=0)
+    thirties = Column(Integer, nullable=False, default=0)
+    fifties = Column(Integer, nullable=False, default=0)
+    hundreds = Column(Integer, nullable=False, default=0)
+    thirties_plus = Column(Integer, nullable=False, default=0)
+    matches_won = Column(Integer, nullable=False, default=0)
+
+    bowling_innings = Column(Integer, nullable=False, default=0)
+    balls_bowled = Column(Integer, nullable=False, default=0)
+    runs_conceded = Column(Integer, nullable=False, default=0)
+    wickets_taken = Column(Integer, nullable=False, default=0)
+    three_fers = Column(Integer, nullable=False, default=0)
+    five_fers = Column(Integer, nullable=False, default=0)
+    best_bowling = Column(Integer, nullable=True)
+    catches = Column(Integer, nullable=False, default=0)
+    runouts = Column(Integer, nullable=False, default=0)
+    stumpings = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PlayerCareerStats(StatsCounters, Base):
+    __tablename__ = "player_career_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+class PlayerGroupStats(StatsCounters, Base):
+    __tablename__ = "player_group_stats"
+
+    # dimension is a Match column name (ground, match_inning, match_result,
+    # batting_position); group_key is that column's value as text
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    dimension = Column(String, primary_key=True)
+    group_key = Column(String, primary_key=True)
+
+class PlayerSeasonStats(StatsCounters, Base):
+    __tablename__ = "player_season_stats"
+
+    # Frozen totals of a closed season: the whole season under dimension ""
+    # (group_key ""), plus one row per breakdown group as in player_group_stats
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    season_id = Column(Integer, ForeignKey("seasons.season_id"), primary_key=True)
+    dimension = Column(String, primary_key=True)
+    group_key = Column(String, primary_key=True)
+
+class LeaderboardEntry(Base):
+    __tablename__ = "leaderboard_entries"
+
+    # One user's value for a metric within a scope: "all" (scope_key ""),
+    # "ground" (the ground name) or "season" (the year)
+    metric = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)
+    scope_key = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    value = Column(Float, nullable=False)
+    matches = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Top-K reads walk this index in value order; "my rank" counts a range of it
+        Index("ix_leaderboard_rank", "metric", "scope", "scope_key", "value", "user_id"),
+        Index("ix_leaderboard_user", "user_id"),
+    )
+
+class LeaderboardDirtyUser(Base):
+    __tablename__ = "leaderboard_dirty_users"
+
+    # Users whose rollups changed since their leaderboard entries were computed
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    marked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,98 @@
+"""Ownership-checked match writes, one statement each.
+
+The owner check is part of the statement (`WHERE match_id IN (...) AND
+user_id = ?`) and RETURNING hands back the affected rows. The old values feed
+the rollup deltas and the new values the response, so nothing is loaded first.
+Matches of closed seasons are left out the same way. Rows that come back
+missing are probed by the callers, only then, to tell "no such match" from
+"someone else's" or "in a closed season".
+
+An edit needs the values from before and after it. On PostgreSQL one
+``UPDATE ... FROM (SELECT ... FOR UPDATE) old ... RETURNING old.*, matches.*``
+returns both. The locking sub-select makes the old values the ones the update
+actually replaced, even with a concurrent writer. Other databases (SQLite)
+can't return a joined table's columns from an UPDATE, and SQLite ignores FOR
+UPDATE. There a no-op UPDATE of the same rows comes first: it opens the write
+transaction and takes the write lock (SQLite's covers the whole database), so
+the SELECT of the old rows after it and the UPDATE ... RETURNING see no other
+writer in between.
+"""
+from types import SimpleNamespace
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from .models import Match, Season, BallChunk
+from .seasons import closed_season_ids
+
+MATCH_COLUMNS = tuple(Match.__table__.columns)
+OLD_PREFIX = "old_"
+
+
+def _owned(user_id: int, match_ids):
+    # The user's matches among match_ids, except those in a closed season
+    return (
+        Match.match_id.in_(match_ids),
+        Match.user_id == user_id,
+        or_(Match.season_id.is_(None), Match.season_id.not_in(closed_season_ids(user_id))),
+    )
+
+
+def delete_owned(db: Session, user_id: int, match_ids):
+    """Delete the user's matches among `match_ids`, and their ball-by-ball
+    chunks; returns the deleted rows."""
+    statement = delete(Match).where(*_owned(user_id, match_ids)).returning(*MATCH_COLUMNS)
+    rows = db.execute(statement).all()
+    if rows:
+        db.execute(delete(BallChunk).where(BallChunk.match_id.in_([row.match_id for row in rows])))
+    return rows
+
+
+def update_owned(db: Session, user_id: int, match_ids, values: dict):
+    """Apply `values` to the user's matches among `match_ids`; returns (old rows, new rows)."""
+    if db.get_bind().dialect.name == "postgresql":
+        old = select(*MATCH_COLUMNS).where(*_owned(user_id, match_ids)).with_for_update().subquery("old")
+        statement = (
+            update(Match)
+            .where(Match.match_id == old.c.match_id)
+            .values(**values)
+            .returning(*(column.label(OLD_PREFIX + column.name) for column in old.c), *MATCH_COLUMNS)
+        )
+        rows = db.execute(statement).all()
+        old_rows = [
+            SimpleNamespace(**{column.name: getattr(row, OLD_PREFIX + column.name) for column in MATCH_COLUMNS})
+            for row in rows
+        ]
+        return old_rows, rows
+
+    owned = _owned(user_id, match_ids)
+    claim = update(Match).where(*owned).values(match_id=Match.match_id).execution_options(synchronize_session=False)
+    db.execute(claim)
+    old_rows = db.execute(select(*MATCH_COLUMNS).where(*owned)).all()
+    if not old_rows:
+        return [], []
+    statement = (
+        update(Match)
+        .where(Match.match_id.in_([row.match_id for row in old_rows]))
+        .values(**values)
+        .returning(*MATCH_COLUMNS)
+    )
+    return old_rows, db.execute(statement).all()
+
+
+def miss_reasons(db: Session, user_id: int, match_ids):
+    """Why the owner-scoped statement skipped these ids: {match_id: "forbidden" | "locked"}.
+
+    "forbidden" is another user's match and "locked" one of the user's own in a
+    closed season; ids that don't exist are left out.
+    """
+    if not match_ids:
+        return {}
+    statement = (
+        select(Match.match_id, Match.user_id, Season.closed_at)
+        .outerjoin(Season, Season.season_id == Match.season_id)
+        .where(Match.match_id.in_(match_ids))
+    )
+    return {
+        match_id: "forbidden" if owner != user_id else "locked"
+        for match_id, owner, closed_at in db.execute(statement)
+        if owner != user_id or closed_at is not None
+    }
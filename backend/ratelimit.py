@@ -0,0 +1,42 @@
+"""Token-bucket rate limits, kept in the shared store so every worker counts
+against the same buckets.
+
+A bucket holds up to `burst` tokens and refills at `per_minute`; each attempt
+takes one. The auth routes check theirs in a dependency, before any bcrypt
+work, so a credential-stuffing burst is turned away with a 429 instead of
+queuing on the password hasher.
+"""
+from fastapi import Request
+from .config import settings
+from .store import store
+
+
+class RateLimited(Exception):
+    """Raised when a bucket is empty; `retry_after` is the seconds until it has a token."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+
+    def check(self, key: str):
+        if self.rate <= 0:
+            return
+        wait = store.take(f"rate:{self.name}:{key}", self.rate, self.burst)
+        if wait:
+            raise RateLimited(wait)
+
+
+login_by_username = TokenBucket("login-user", settings.login_rate_per_minute, settings.login_burst)
+login_by_ip = TokenBucket("login-ip", settings.login_ip_rate_per_minute, settings.login_ip_burst)
+register_by_ip = TokenBucket("register-ip", settings.register_rate_per_minute, settings.register_burst)
+
+
+def client_ip(request: Request):
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the real client
+    return request.client.host if request.client else "unknown"
@@ -0,0 +1,33 @@
+"""Read paths that serialize SQL rows directly, without per-row Pydantic models.
+
+Rows written through the API were validated on the way in, so reading them back
+doesn't need to run every row through a response model. Here the MatchResponse
+columns are selected as plain tuples, zipped into dicts in MatchResponse's field
+order, and encoded by orjson, which handles dates and enums natively. The
+output is the same JSON the validated path produces.
+"""
+import orjson
+from sqlalchemy import select
+from .models import Match
+from .schemas import MatchResponse
+
+# balls_bowled is a computed field on the schema and a stored column on Match
+MATCH_RESPONSE_FIELDS = tuple(MatchResponse.model_fields) + ("balls_bowled",)
+
+
+def select_match_rows(*filters):
+    return select(*(getattr(Match, field) for field in MATCH_RESPONSE_FIELDS)).where(*filters)
+
+
+def match_rows(rows):
+    return [dict(zip(MATCH_RESPONSE_FIELDS, row)) for row in rows]
+
+
+def match_response(row):
+    # For rows carrying other columns too, e.g. the full rows from RETURNING
+    return {field: getattr(row, field) for field in MATCH_RESPONSE_FIELDS}
+
+
+def ndjson_lines(rows):
+    return b"".join(orjson.dumps(dict(zip(MATCH_RESPONSE_FIELDS, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
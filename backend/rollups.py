@@ -0,0 +1,451 @@
+"""Incrementally maintained per-user stats rollups.
+
+Match writes apply the changed match's contribution as a delta to the user's
+career row and to one row per breakdown group, inside the same transaction as
+the write. Running maxima (highest score, best bowling) can't be un-applied, so
+removing the match that holds one recomputes just that row from `matches`.
+A row that doesn't exist yet is built from `matches` rather than from the
+delta, so matches written before the rollups existed are counted too;
+migration 0006 backfills every user up front.
+
+Rebuild or check the rollups against the raw matches with:
+
+    python -m backend.rollups verify [--user ID]
+    python -m backend.rollups rebuild [--user ID]
+"""
+import argparse
+import enum
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .models import Match, PlayerCareerStats, PlayerGroupStats, LeaderboardDirtyUser, InningType, MatchResult
+from .stats import (
+    empty_batting_totals, empty_bowling_totals, add_batting_match, add_bowling_match,
+    sql_batting_totals, sql_bowling_totals, batting_stats_from_totals, bowling_stats_from_totals,
+    batting_totals_columns, bowling_totals_columns,
+)
+
+DIMENSIONS = ("ground", "match_inning", "match_result", "batting_position")
+MAX_FIELDS = ("highest_score", "best_bowling")
+COUNTER_FIELDS = [column.name for column in PlayerCareerStats.__table__.columns if column.name not in ("user_id", "updated_at")]
+ADDITIVE_FIELDS = [field for field in COUNTER_FIELDS if field not in MAX_FIELDS]
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def to_counters(batting: dict, bowling: dict):
+    # Merge batting and bowling totals into the rollup column layout
+    counters = dict(batting)
+    for field, value in bowling.items():
+        if field == "innings":
+            counters["bowling_innings"] = value
+        elif field != "matches":
+            counters[field] = value
+    return counters
+
+
+def empty_counters():
+    return to_counters(empty_batting_totals(), empty_bowling_totals())
+
+
+def batting_stats(counters: dict):
+    return batting_stats_from_totals({field: counters[field] for field in empty_batting_totals()})
+
+
+def bowling_stats(counters: dict):
+    totals = {field: counters[field] for field in empty_bowling_totals() if field != "innings"}
+    totals["innings"] = counters["bowling_innings"]
+    return bowling_stats_from_totals(totals)
+
+
+def group_key(value):
+    if value is None:
+        return None
+    return value.value if isinstance(value, enum.Enum) else str(value)
+
+
+def parse_group_key(dimension: str, key: str):
+    if dimension == "match_inning":
+        return InningType(key)
+    if dimension == "match_result":
+        return MatchResult(key)
+    if dimension == "batting_position":
+        return int(key)
+    return key
+
+
+def row_counters(row):
+    return {field: getattr(row, field) for field in COUNTER_FIELDS}
+
+
+def snapshot(match):
+    # Detached copy of a match's column values, taken before it is modified
+    return SimpleNamespace(**{column.name: getattr(match, column.name) for column in Match.__table__.columns})
+
+
+def match_counters(match):
+    batting = add_batting_match(empty_batting_totals(), match)
+    bowling = add_bowling_match(empty_bowling_totals(), match)
+    return to_counters(batting, bowling)
+
+
+def _recompute(db: Session, row, user_id: int, filters=()):
+    db.flush()
+    counters = sql_counters(db, user_id, filters=filters)
+    for field, value in counters.items():
+        setattr(row, field, value)
+    if not row.matches:
+        if row in db.new:
+            db.expunge(row)
+        else:
+            db.delete(row)
+
+
+def _row_key(model, ident: dict):
+    return (model.__tablename__, *ident.values())
+
+
+def _rollup_row(user_id: int, dimension, key):
+    # (model, ident) of a compute_user_rollups() entry
+    if dimension is None:
+        return PlayerCareerStats, {"user_id": user_id}
+    return PlayerGroupStats, {"user_id": user_id, "dimension": dimension, "group_key": key}
+
+
+def _insert_built(db: Session, model, ident: dict, counters: dict):
+    # False if another transaction inserted the row first
+    dialect = db.get_bind().dialect.name
+    if dialect not in UPSERT_DIALECTS:
+        db.add(model(**ident, **counters))
+        return True
+    statement = UPSERT_DIALECTS[dialect](model).values(**ident, **counters)
+    return db.execute(statement.on_conflict_do_nothing()).rowcount > 0
+
+
+def _build_missing(db: Session, model, ident: dict, filters, rebuilt: set):
+    """Build a missing rollup row from `matches`; False if another transaction created it first.
+
+    Without a career row the user's rollups were never built (matches that
+    predate them, until the backfill runs), so all of the user's rows are
+    built, not just the ones this write touches. A missing group row alone has
+    drifted and is rebuilt by itself. The write being applied is already
+    flushed, so the aggregates include it. Concurrent first writes race on the
+    insert: the loser's ON CONFLICT DO NOTHING inserts nothing, and it applies
+    its delta to the winner's row instead.
+    """
+    db.flush()
+    user_id = ident["user_id"]
+    if model is PlayerCareerStats:
+        built = [(*_rollup_row(user_id, dimension, key), counters)
+                 for (dimension, key), counters in compute_user_rollups(db, user_id).items()]
+    else:
+        built = [(model, ident, sql_counters(db, user_id, filters=filters))]
+
+    target = _row_key(model, ident)
+    target_inserted = None
+    for row_model, row_ident, counters in built:
+        if not counters["matches"]:
+            continue
+        key = _row_key(row_model, row_ident)
+        inserted = _insert_built(db, row_model, row_ident, counters)
+        if inserted:
+            rebuilt.add(key)
+        if key == target:
+            target_inserted = inserted
+    if target_inserted is None:
+        # No matches left for this row, so it rightly doesn't exist
+        rebuilt.add(target)
+        return True
+    return target_inserted
+
+
+def _apply(db: Session, model, ident: dict, counters: dict, sign: int, filters, rebuilt: set):
+    # `rebuilt` collects rows built from `matches` during this change; they
+    # already reflect all of it, so its other deltas skip them
+    if _row_key(model, ident) in rebuilt:
+        return
+    row = db.query(model).filter_by(**ident).with_for_update().first()
+    if row is None:
+        if _build_missing(db, model, ident, filters, rebuilt):
+            return
+        row = db.query(model).filter_by(**ident).with_for_update().first()
+
+    for field in ADDITIVE_FIELDS:
+        setattr(row, field, getattr(row, field) + sign * counters[field])
+
+    stale = False
+    for field in MAX_FIELDS:
+        value, current = counters[field], getattr(row, field)
+        if sign > 0:
+            if value is not None and (current is None or value > current):
+                setattr(row, field, value)
+        elif value is not None and value == current:
+            stale = True
+
+    if row.matches <= 0:
+        db.delete(row)
+    elif stale:
+        _recompute(db, row, ident["user_id"], filters)
+
+
+def _targets(match):
+    # Every rollup row a match contributes to, as (model, ident, filters)
+    yield PlayerCareerStats, {"user_id": match.user_id}, ()
+    for dimension in DIMENSIONS:
+        value = getattr(match, dimension)
+        if value is not None:
+            ident = {"user_id": match.user_id, "dimension": dimension, "group_key": group_key(value)}
+            yield PlayerGroupStats, ident, (getattr(Match, dimension) == value,)
+
+
+def mark_leaderboard_dirty(db: Session, user_ids):
+    """Queue these users' leaderboard entries for a refresh (see leaderboards.py).
+
+    A new marked_at tells a refresh already in flight that it missed this write.
+    """
+    if not user_ids:
+        return
+    rows = [{"user_id": user_id, "marked_at": datetime.utcnow()} for user_id in user_ids]
+    dialect = db.get_bind().dialect.name
+    if dialect in UPSERT_DIALECTS:
+        statement = UPSERT_DIALECTS[dialect](LeaderboardDirtyUser).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id"], set_={"marked_at": statement.excluded.marked_at}))
+    else:
+        for row in rows:
+            db.merge(LeaderboardDirtyUser(**row))
+
+
+def apply_match(db: Session, match, sign: int, rebuilt=None):
+    """Add (sign=1) or remove (sign=-1) one match's contribution to its user's rollups."""
+    rebuilt = set() if rebuilt is None else rebuilt
+    counters = match_counters(match)
+    for model, ident, filters in _targets(match):
+        _apply(db, model, ident, counters, sign, filters, rebuilt)
+
+
+def _combine(merged: dict, counters: dict):
+    # Fold another set of matches' counters into `merged`
+    for field in ADDITIVE_FIELDS:
+        merged[field] += counters[field]
+    for field in MAX_FIELDS:
+        if counters[field] is not None and (merged[field] is None or counters[field] > merged[field]):
+            merged[field] = counters[field]
+
+
+def _merged_targets(matches):
+    # Each rollup row the matches touch, with their counters combined
+    pending = {}
+    for match in matches:
+        counters = match_counters(match)
+        for model, ident, filters in _targets(match):
+            key = (model.__tablename__, *ident.values())
+            if key not in pending:
+                pending[key] = (model, ident, dict(counters), filters)
+            else:
+                _combine(pending[key][2], counters)
+    return pending.values()
+
+
+def apply_match_changes(db: Session, old=(), new=()):
+    """apply_match_change() for many matches, touching each rollup row once per side.
+
+    `old` holds the removed or pre-edit matches, `new` the added or edited ones.
+    Removing a combined set is exact for the additive fields, and a maximum is
+    recomputed whenever the set being removed holds it.
+    """
+    rebuilt = set()
+    for sign, matches in ((1, new), (-1, old)):
+        for model, ident, counters, filters in _merged_targets(matches):
+            _apply(db, model, ident, counters, sign, filters, rebuilt)
+    mark_leaderboard_dirty(db, {match.user_id for match in (*old, *new)})
+
+
+def add_matches(db: Session, matches):
+    """Add many new matches to the rollups, touching each rollup row once."""
+    apply_match_changes(db, new=matches)
+
+
+def apply_match_change(db: Session, old=None, new=None):
+    """Update rollups for a created (old=None), deleted (new=None) or edited match.
+
+    Call after the change has been flushed, before commit. `old` should be a
+    snapshot() taken before the match was modified.
+    """
+    rebuilt = set()
+    if new is not None:
+        apply_match(db, new, 1, rebuilt)
+    if old is not None:
+        # Removal goes last so that any recompute it triggers sees the final state
+        apply_match(db, old, -1, rebuilt)
+    mark_leaderboard_dirty(db, {match.user_id for match in (old, new) if match is not None})
+
+
+def sql_counters(db: Session, user_id: int, filters=()):
+    """Counters for the user's matches (narrowed by `filters`), aggregated by the database."""
+    return to_counters(sql_batting_totals(db, user_id, filters=filters), sql_bowling_totals(db, user_id, filters=filters))
+
+
+def sql_group_counters(db: Session, user_id: int, dimension: str, filters=()):
+    """{key: counters} for one breakdown, aggregated by the database; keys are Match column values."""
+    column = getattr(Match, dimension)
+    bowling = dict(sql_bowling_totals(db, user_id, group_by=column, filters=filters))
+    return {
+        key: to_counters(batting, bowling[key])
+        for key, batting in sql_batting_totals(db, user_id, group_by=column, filters=filters) if key is not None
+    }
+
+
+def career_counters(db: Session, user_id: int):
+    """The user's career rollup, aggregated from matches if it hasn't been built."""
+    row = db.get(PlayerCareerStats, user_id)
+    if row is not None:
+        return row_counters(row)
+    return sql_counters(db, user_id)
+
+
+def group_counters(db: Session, user_id: int, dimension: str, keys=None):
+    """(key, counters) pairs for one breakdown, read from the group rollups.
+
+    Keys are returned as Match column values. As with stats.group_matches(),
+    passing `keys` includes empty groups, otherwise the present keys come back
+    sorted.
+    """
+    rows = db.query(PlayerGroupStats).filter(
+        PlayerGroupStats.user_id == user_id,
+        PlayerGroupStats.dimension == dimension
+    ).all()
+    if rows:
+        groups = {parse_group_key(dimension, row.group_key): row_counters(row) for row in rows}
+    else:
+        # Nothing rolled up (no matches, or rollups not built yet)
+        groups = sql_group_counters(db, user_id, dimension)
+
+    return with_keys(groups, keys)
+
+
+def with_keys(groups: dict, keys=None):
+    # [(key, counters)] in `keys` order with empty groups filled in, or the present keys sorted
+    if keys is None:
+        keys = sorted(groups)
+    return [(key, groups.get(key) or empty_counters()) for key in keys]
+
+
+def breakdown_counters(db: Session, user_id: int, dimensions, keys: dict = None):
+    """group_counters() for several dimensions, reading their rollups in one query.
+
+    `keys` maps a dimension to the keys to return for it. Returns
+    {dimension: [(key, counters), ...]}.
+    """
+    keys = keys or {}
+    # A user has a few dozen group rows at most, so read them all by the key prefix
+    rows = db.query(PlayerGroupStats).filter(PlayerGroupStats.user_id == user_id).all()
+    if not rows:
+        return {dimension: group_counters(db, user_id, dimension, keys.get(dimension)) for dimension in dimensions}
+
+    groups = {dimension: {} for dimension in dimensions}
+    for row in rows:
+        if row.dimension in groups:
+            groups[row.dimension][parse_group_key(row.dimension, row.group_key)] = row_counters(row)
+    return {dimension: with_keys(groups[dimension], keys.get(dimension)) for dimension in dimensions}
+
+
+def compute_user_rollups(db: Session, user_id: int):
+    """Recompute a user's rollups from raw matches as {(dimension, key): counters}.
+
+    One aggregate query grouped by every breakdown dimension at once returns a
+    row per combination of keys the user has played (a few hundred at most),
+    which are then folded into the career row and each breakdown group. That
+    reads the user's matches once instead of twice per breakdown.
+    """
+    keys = [getattr(Match, dimension) for dimension in DIMENSIONS]
+    batting, bowling = batting_totals_columns(), bowling_totals_columns()
+    batting_labels = [column.name for column in batting]
+    bowling_labels = [column.name for column in bowling]
+    rows = db.query(*keys, *batting, *bowling).filter(Match.user_id == user_id).group_by(*keys).all()
+
+    rollups = {}
+    for row in rows:
+        values = row[len(keys):]
+        counters = to_counters(dict(zip(batting_labels, values)), dict(zip(bowling_labels, values[len(batting):])))
+        targets = [(None, None)]
+        targets += [(dimension, group_key(value)) for dimension, value in zip(DIMENSIONS, row) if value is not None]
+        for target in targets:
+            if target in rollups:
+                _combine(rollups[target], counters)
+            else:
+                rollups[target] = dict(counters)
+    return rollups
+
+
+def stored_user_rollups(db: Session, user_id: int):
+    rollups = {}
+    career = db.get(PlayerCareerStats, user_id)
+    if career is not None:
+        rollups[(None, None)] = row_counters(career)
+    for row in db.query(PlayerGroupStats).filter(PlayerGroupStats.user_id == user_id):
+        rollups[(row.dimension, row.group_key)] = row_counters(row)
+    return rollups
+
+
+def find_drift(db: Session, user_id: int):
+    """List (dimension, key, field, stored, expected) for every rollup value that is off."""
+    expected, stored = compute_user_rollups(db, user_id), stored_user_rollups(db, user_id)
+    drift = []
+    for dimension, key in sorted(expected.keys() | stored.keys(), key=str):
+        want = expected.get((dimension, key), {})
+        have = stored.get((dimension, key), {})
+        for field in COUNTER_FIELDS:
+            if want.get(field) != have.get(field):
+                drift.append((dimension, key, field, have.get(field), want.get(field)))
+    return drift
+
+
+def rebuild_user(db: Session, user_id: int):
+    db.query(PlayerCareerStats).filter(PlayerCareerStats.user_id == user_id).delete()
+    db.query(PlayerGroupStats).filter(PlayerGroupStats.user_id == user_id).delete()
+    for (dimension, key), counters in compute_user_rollups(db, user_id).items():
+        if dimension is None:
+            db.add(PlayerCareerStats(user_id=user_id, **counters))
+        else:
+            db.add(PlayerGroupStats(user_id=user_id, dimension=dimension, group_key=key, **counters))
+    mark_leaderboard_dirty(db, [user_id])
+
+
+def all_user_ids(db: Session):
+    ids = {row[0] for row in db.query(Match.user_id).distinct()}
+    ids |= {row[0] for row in db.query(PlayerCareerStats.user_id)}
+    ids |= {row[0] for row in db.query(PlayerGroupStats.user_id).distinct()}
+    return sorted(ids)
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the per-user stats rollups")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user", type=int, help="only this user id")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        user_ids = [args.user] if args.user else all_user_ids(db)
+        drifted = 0
+        for user_id in user_ids:
+            drift = find_drift(db, user_id)
+            if drift:
+                drifted += 1
+                for dimension, key, field, have, want in drift:
+                    print(f"user {user_id} {dimension or 'career'}:{key or '-'} {field}: stored={have} expected={want}")
+            if args.command == "rebuild":
+                rebuild_user(db, user_id)
+                db.commit()
+        print(f"{len(user_ids)} users checked, {drifted} with drift" + (", rebuilt" if args.command == "rebuild" else ""))
+        return 1 if drifted and args.command == "verify" else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,34 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator, model_validator
+from typing import Optional, List
 from datetime import date
-from .models import YesorNo, InningType, MatchResult
+import datetime
+from .models import YesorNo, InningType, MatchResult, SeasonKind, BallRole, ExtraType, DismissalType
+from .stats import overs_to_balls
+
+MAX_BATCH_MATCH_IDS = 1000     # per batch delete / update request
+MAX_BALLS_PER_APPEND = 600     # per ball-by-ball append request
+
+def check_overs_notation(overs: Optional[float]):
+    # Cricket notation: the digit after the point counts balls, so 4.3 is valid and 4.7 isn't
+    if overs is None:
+        return overs
+    tenths = round(overs * 10)
+    if overs < 0 or abs(overs * 10 - tenths) > 1e-6 or tenths % 10 > 5:
+        raise ValueError("overs_bowled must be in overs.balls notation with 0-5 balls, e.g. 3.4")
+    return overs
+
+class OversMixin:
+    """Validates overs_bowled and derives the integer balls_bowled stored alongside it."""
+
+    @field_validator("overs_bowled", check_fields=False)
+    @classmethod
+    def validate_overs(cls, overs):
+        return check_overs_notation(overs)
+
+    @computed_field
+    @property
+    def balls_bowled(self) -> Optional[int]:
+        return None if self.overs_bowled is None else overs_to_balls(self.overs_bowled)
 
 class UserBase(BaseModel):
     username: str
@@ -20,6 +47,18 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserProvisionRequest(BaseModel):
+    users: List[UserBase]
+
+class SkippedUser(BaseModel):
+    username: str
+    email: str
+    reason: str
+
+class UserProvisionResponse(BaseModel):
+    created: List[UserResponse]
+    skipped: List[SkippedUser]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -27,7 +66,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     user_id: Optional[int] = None
 
-class MatchBase(BaseModel):
+class MatchBase(OversMixin, BaseModel):
     date: date
     ground: str
     came_to_bat: YesorNo
@@ -47,6 +86,7 @@ class MatchBase(BaseModel):
     wides: Optional[int] = None
     no_balls: Optional[int] = None
     match_result: MatchResult
+    season_id: Optional[int] = None
 
 class MatchCreate(MatchBase):
     pass
@@ -57,13 +97,17 @@ class MatchResponse(MatchBase):
     class Config:
         from_attributes = True
 
-class MatchUpdate(BaseModel):
-    date: Optional[date] = None
+class MatchPageResponse(BaseModel):
+    matches: List[MatchResponse]
+    next_cursor: Optional[str] = None
+
+class MatchUpdate(OversMixin, BaseModel):
+    date: Optional[datetime.date] = None
     ground: Optional[str] = None
     came_to_bat: Optional[YesorNo] = None
     batting_position: Optional[int] = None
-    runs: Optional[int] = None
-    balls: Optional[int] = None
+    runs_scored: Optional[int] = None
+    balls_faced: Optional[int] = None
     fours: Optional[int] = None
     sixes: Optional[int] = None
     out: Optional[YesorNo] = None
@@ -77,6 +121,73 @@ class MatchUpdate(BaseModel):
     wides: Optional[int] = None
     no_balls: Optional[int] = None
     match_result: Optional[MatchResult] = None
+    season_id: Optional[int] = None
+
+class MatchIdsRequest(BaseModel):
+    match_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_MATCH_IDS)
+
+class MatchBatchUpdateRequest(MatchIdsRequest):
+    changes: MatchUpdate
+
+class MatchBatchDeleteResponse(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+    forbidden: List[int]
+    locked: List[int]
+
+class MatchBatchUpdateResponse(BaseModel):
+    updated: List[MatchResponse]
+    not_found: List[int]
+    forbidden: List[int]
+    locked: List[int]
+
+class BallEvent(BaseModel):
+    role: BallRole
+    runs: int = Field(0, ge=0, le=7)              # off the bat
+    boundary: bool = False
+    extra: ExtraType = ExtraType.NONE
+    extra_runs: int = Field(0, ge=0, le=7)        # a wide's or no-ball's penalty run included
+    wicket: DismissalType = DismissalType.NONE
+
+    @model_validator(mode="after")
+    def check_consistent(self):
+        if self.boundary and self.runs not in (4, 6):
+            raise ValueError("a boundary is 4 or 6 runs")
+        if self.extra == ExtraType.NONE and self.extra_runs:
+            raise ValueError("extra_runs needs an extra type")
+        if self.extra in (ExtraType.WIDE, ExtraType.NO_BALL) and not self.extra_runs:
+            raise ValueError("a wide or no-ball carries at least its penalty run")
+        if self.extra == ExtraType.WIDE and self.runs:
+            raise ValueError("no runs come off the bat on a wide")
+        if self.role == BallRole.FIELDING and (
+            self.runs or self.extra != ExtraType.NONE
+            or self.wicket not in (DismissalType.CAUGHT, DismissalType.RUN_OUT, DismissalType.STUMPED)
+        ):
+            raise ValueError("a fielding event is just the catch, run out or stumping")
+        return self
+
+class BallAppendRequest(BaseModel):
+    # Number of balls already recorded, if the client tracks it; makes retries safe
+    offset: Optional[int] = Field(None, ge=0)
+    balls: List[BallEvent] = Field(..., min_length=1, max_length=MAX_BALLS_PER_APPEND)
+
+class BallAppendResponse(BaseModel):
+    recorded: int
+    match: MatchResponse
+
+class BallListResponse(BaseModel):
+    match_id: int
+    balls: List[BallEvent]
+
+class MatchImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class MatchImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[MatchImportError]
+    errors_truncated: bool
 
 class BattingStatsResponse(BaseModel):
     matches: int
@@ -149,3 +260,63 @@ class BowlingMatchResultWiseResponse(BowlingStatsResponse):
 
 class BowlingGroundWiseResponse(BowlingStatsResponse):
     ground: str
+
+class FormWindowResponse(BaseModel):
+    last_matches: Optional[int] = None
+    from_date: Optional[date] = None
+    to_date: Optional[date] = None
+    batting: BattingStatsResponse
+    bowling: BowlingStatsResponse
+
+class CareerProgressionPoint(BaseModel):
+    match_id: int
+    date: datetime.date
+    matches: int
+    runs_scored: int
+    batting_average: Optional[float]
+    batting_strike_rate: Optional[float]
+    highest_score: Optional[int]
+    wickets_taken: int
+    bowling_average: Optional[float]
+    economy_rate: Optional[float]
+    best_bowling: Optional[str]
+
+class LeaderboardRow(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    value: float
+    matches: int
+
+class LeaderboardResponse(BaseModel):
+    metric: str
+    scope: str
+    scope_key: str
+    total: int
+    entries: List[LeaderboardRow]
+    me: Optional[LeaderboardRow] = None
+
+class SeasonCreate(BaseModel):
+    name: str
+    kind: SeasonKind = SeasonKind.SEASON
+    start_date: date
+    end_date: date
+
+    @field_validator("end_date")
+    @classmethod
+    def validate_end_date(cls, end_date, info):
+        start_date = info.data.get("start_date")
+        if start_date is not None and end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        return end_date
+
+class SeasonResponse(BaseModel):
+    season_id: int
+    name: str
+    kind: SeasonKind
+    start_date: date
+    end_date: date
+    closed_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,197 @@
+"""Seasons and tournaments: season-filtered stats, frozen summaries of closed
+seasons, and the yearly partitions of `matches` on Postgres.
+
+An open season's stats are aggregated from its matches on request. The filter
+names the season and its date range, so on a partitioned Postgres table only
+the partitions for those years are read. Closing a season freezes its totals
+and breakdowns into player_season_stats, and from then on its stats are a
+primary-key read. Matches of a closed season can't be added, changed or removed
+until it is reopened, which drops the frozen rows.
+
+On Postgres, migration 0004 turns `matches` into a table partitioned by year of
+`date`, with a default partition for years not yet created. Create the coming
+years ahead of time (e.g. from a yearly cron job), and re-freeze closed seasons
+after repairing data by hand:
+
+    python -m backend.seasons partitions [--ahead 1]
+    python -m backend.seasons freeze [--season ID]
+"""
+import argparse
+import sys
+from datetime import date, datetime
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from .models import Match, Season, PlayerSeasonStats
+from .rollups import DIMENSIONS, empty_counters, group_key, parse_group_key, row_counters, sql_counters, sql_group_counters, with_keys
+
+SEASON_TOTAL = ""     # dimension and group_key of a frozen season's overall row
+DEFAULT_PARTITION = "matches_default"
+
+
+def season_filters(season: Season):
+    # The date range is implied by season_id, but spelling it out lets Postgres prune partitions
+    return (
+        Match.season_id == season.season_id,
+        Match.date >= season.start_date,
+        Match.date <= season.end_date,
+    )
+
+
+def user_season(db: Session, user_id: int, season_id: int):
+    season = db.get(Season, season_id)
+    return season if season is not None and season.user_id == user_id else None
+
+
+def closed_season_ids(user_id: int):
+    return select(Season.season_id).where(Season.user_id == user_id, Season.closed_at.is_not(None))
+
+
+def season_error(season: Season, season_id: int, match_date: date):
+    """Why a match on `match_date` can't be in this season (None if it can; a None date skips the range check)."""
+    if season is None:
+        return f"Season {season_id} not found"
+    if season.closed_at is not None:
+        return f"Season {season_id} is closed; reopen it to change its matches"
+    if match_date is not None and not season.start_date <= match_date <= season.end_date:
+        return f"Match date {match_date} is outside season {season_id} ({season.start_date} to {season.end_date})"
+    return None
+
+
+def matches_outside_seasons(db: Session, match_ids):
+    """Ids among `match_ids` whose date falls outside their season's range."""
+    statement = (
+        select(Match.match_id)
+        .join(Season, Season.season_id == Match.season_id)
+        .where(Match.match_id.in_(match_ids), (Match.date < Season.start_date) | (Match.date > Season.end_date))
+    )
+    return list(db.execute(statement).scalars())
+
+
+def _frozen(db: Session, season: Season):
+    # user_id leads the primary key
+    return db.query(PlayerSeasonStats).filter(
+        PlayerSeasonStats.user_id == season.user_id,
+        PlayerSeasonStats.season_id == season.season_id,
+    )
+
+
+def _frozen_rows(db: Session, season: Season, dimension: str):
+    return _frozen(db, season).filter(PlayerSeasonStats.dimension == dimension).all()
+
+
+def season_counters(db: Session, season: Season):
+    """The season's overall counters: frozen if it is closed, aggregated if not."""
+    if season.closed_at is None:
+        return sql_counters(db, season.user_id, filters=season_filters(season))
+    rows = _frozen_rows(db, season, SEASON_TOTAL)
+    return row_counters(rows[0]) if rows else empty_counters()
+
+
+def season_group_counters(db: Session, season: Season, dimension: str, keys=None):
+    """group_counters() within one season."""
+    if season.closed_at is None:
+        groups = sql_group_counters(db, season.user_id, dimension, filters=season_filters(season))
+    else:
+        groups = {parse_group_key(dimension, row.group_key): row_counters(row) for row in _frozen_rows(db, season, dimension)}
+    return with_keys(groups, keys)
+
+
+def freeze_season(db: Session, season: Season):
+    """Store the season's totals and breakdowns and mark it closed."""
+    filters = season_filters(season)
+    _frozen(db, season).delete()
+    summary = sql_counters(db, season.user_id, filters=filters)
+    if summary["matches"]:
+        db.add(PlayerSeasonStats(user_id=season.user_id, season_id=season.season_id,
+                                 dimension=SEASON_TOTAL, group_key=SEASON_TOTAL, **summary))
+        for dimension in DIMENSIONS:
+            for key, counters in sql_group_counters(db, season.user_id, dimension, filters=filters).items():
+                db.add(PlayerSeasonStats(user_id=season.user_id, season_id=season.season_id,
+                                         dimension=dimension, group_key=group_key(key), **counters))
+    if season.closed_at is None:
+        season.closed_at = datetime.utcnow()
+
+
+def reopen_season(db: Session, season: Season):
+    _frozen(db, season).delete()
+    season.closed_at = None
+
+
+def is_partitioned(connection):
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('matches')"
+    )).first() is not None
+
+
+def year_partitions(connection):
+    rows = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('matches')"
+    ))
+    return {int(name[len("matches_y"):]) for (name,) in rows if name.startswith("matches_y")}
+
+
+def create_year_partition(connection, year: int):
+    """Add the partition for one year, moving any of its rows out of the default partition."""
+    bounds = {"start": date(year, 1, 1), "end": date(year + 1, 1, 1)}
+    name = f"matches_y{year}"
+    connection.execute(text(f"CREATE TABLE {name} (LIKE matches INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(
+        f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end"), bounds)
+    connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end"), bounds)
+    connection.execute(text(
+        f"ALTER TABLE matches ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"))
+
+
+def ensure_year_partitions(connection, ahead: int = 1):
+    """Create partitions for the years in the default partition and the next `ahead` years; returns the new years."""
+    existing = year_partitions(connection)
+    wanted = {int(year) for (year,) in connection.execute(text(
+        f"SELECT DISTINCT CAST(EXTRACT(YEAR FROM date) AS INTEGER) FROM {DEFAULT_PARTITION}"))}
+    this_year = date.today().year
+    wanted |= set(range(this_year, this_year + ahead + 1))
+    created = sorted(wanted - existing)
+    for year in created:
+        create_year_partition(connection, year)
+    return created
+
+
+def main(argv=None):
+    from .database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Manage match partitions and frozen season summaries")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    partitions = subparsers.add_parser("partitions", help="create upcoming yearly partitions (Postgres)")
+    partitions.add_argument("--ahead", type=int, default=1, help="years after this one to create")
+    freeze = subparsers.add_parser("freeze", help="recompute the frozen summaries of closed seasons")
+    freeze.add_argument("--season", type=int, help="only this season id")
+    args = parser.parse_args(argv)
+
+    if args.command == "partitions":
+        with engine.begin() as connection:
+            if not is_partitioned(connection):
+                print("matches is not partitioned (Postgres only, see migration 0004); nothing to do")
+                return 0
+            created = ensure_year_partitions(connection, args.ahead)
+        print(f"created partitions for {', '.join(map(str, created))}" if created else "all partitions exist")
+        return 0
+
+    db = SessionLocal()
+    try:
+        query = db.query(Season).filter(Season.closed_at.is_not(None))
+        if args.season:
+            query = query.filter(Season.season_id == args.season)
+        seasons = query.all()
+        for season in seasons:
+            freeze_season(db, season)
+            db.commit()
+        print(f"{len(seasons)} closed seasons re-frozen")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+from collections import defaultdict
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import Session
+from .models import Match, YesorNo, MatchResult
+
+# Best bowling figures are packed into one sortable integer (more wickets first,
+# then fewer runs) so SQL can pick them with a plain MAX()
+BOWLING_FIGURES_SCALE = 1000
+
+
+def load_user_matches(db: Session, user_id: int):
+    # One round-trip for every breakdown instead of one query per group
+    return db.query(Match).filter(Match.user_id == user_id).all()
+
+
+def group_matches(matches, attr: str, keys=None):
+    """Split matches into (key, matches) pairs on a single attribute in one pass.
+
+    When `keys` is given, every key is returned (empty groups included) in that
+    order. Otherwise the non-null keys present in the data are returned sorted.
+    """
+    groups = defaultdict(list)
+    for match in matches:
+        groups[getattr(match, attr)].append(match)
+
+    if keys is None:
+        keys = sorted(key for key in groups if key is not None)
+    return [(key, groups.get(key, [])) for key in keys]
+
+
+def labelled_stats(groups, calc, label: str, format_key=None):
+    # Runs `calc` once per (key, group) pair and tags each result with its group label
+    results = []
+    for key, group in groups:
+        stats = calc(group)
+        stats[label] = format_key(key) if format_key else key
+        results.append(stats)
+    return results
+
+
+def grouped_stats(matches, attr: str, calc, label: str, keys=None, format_key=None):
+    return labelled_stats(group_matches(matches, attr, keys), calc, label, format_key)
+
+
+def overs_to_balls(overs):
+    # Cricket notation: 4.3 overs is 4 overs and 3 balls, i.e. 27 balls
+    if not overs:
+        return 0
+    tenths = round(overs * 10)
+    return tenths - 4 * (tenths // 10)
+
+
+def encode_bowling_figures(wickets: int, runs_conceded: int):
+    return wickets * BOWLING_FIGURES_SCALE - runs_conceded
+
+
+def decode_bowling_figures(figures: int):
+    wickets = -(-figures // BOWLING_FIGURES_SCALE)
+    return wickets, wickets * BOWLING_FIGURES_SCALE - figures
+
+
+def empty_batting_totals():
+    return {
+        "matches": 0,
+        "innings": 0,
+        "runs_scored": 0,
+        "balls_faced": 0,
+        "fours": 0,
+        "sixes": 0,
+        "highest_score": 0,
+        "dismissals": 0,
+        "ducks": 0,
+        "thirties": 0,
+        "fifties": 0,
+        "hundreds": 0,
+        "thirties_plus": 0,
+        "matches_won": 0,
+    }
+
+
+def empty_bowling_totals():
+    return {
+        "matches": 0,
+        "innings": 0,
+        "balls_bowled": 0,
+        "runs_conceded": 0,
+        "wickets_taken": 0,
+        "three_fers": 0,
+        "five_fers": 0,
+        "best_bowling": None,
+        "catches": 0,
+        "runouts": 0,
+        "stumpings": 0,
+    }
+
+
+def _or_zero(value):
+    return value if value is not None else 0
+
+
+def add_batting_match(totals: dict, match):
+    # Missing values count as 0 and never match a threshold, as in the SQL totals
+    runs = match.runs_scored
+    totals["matches"] += 1
+    if match.came_to_bat == YesorNo.YES:
+        totals["innings"] += 1
+    totals["runs_scored"] += _or_zero(runs)
+    totals["balls_faced"] += _or_zero(match.balls_faced)
+    totals["fours"] += _or_zero(match.fours)
+    totals["sixes"] += _or_zero(match.sixes)
+    totals["highest_score"] = max(totals["highest_score"], _or_zero(runs))
+    if runs is not None and runs > 29:
+        totals["thirties_plus"] += 1
+        if runs > 99:
+            totals["hundreds"] += 1
+        elif runs > 49:
+            totals["fifties"] += 1
+        else:
+            totals["thirties"] += 1
+    if match.match_result == MatchResult.WON:
+        totals["matches_won"] += 1
+
+    if match.out == YesorNo.YES:
+        totals["dismissals"] += 1
+        if (runs == 0):
+            totals["ducks"] += 1
+    return totals
+
+
+def add_bowling_match(totals: dict, match):
+    wickets = _or_zero(match.wickets)
+    totals["matches"] += 1
+    balls = _or_zero(match.balls_bowled)
+    if balls:
+        totals["innings"] += 1
+    totals["wickets_taken"] += wickets
+    if wickets:
+        if (wickets > 4):
+            totals["five_fers"] += 1
+        elif (wickets > 2):
+            totals["three_fers"] += 1
+        if match.runs_conceded is not None:
+            figures = encode_bowling_figures(wickets, match.runs_conceded)
+            if totals["best_bowling"] is None or figures > totals["best_bowling"]:
+                totals["best_bowling"] = figures
+    totals["runs_conceded"] += _or_zero(match.runs_conceded)
+    totals["balls_bowled"] += balls
+    totals["catches"] += _or_zero(match.catches)
+    totals["runouts"] += _or_zero(match.run_outs)
+    totals["stumpings"] += _or_zero(match.stumpings)
+    return totals
+
+
+def batting_stats_from_totals(totals: dict):
+    runs, balls = totals["runs_scored"], totals["balls_faced"]
+    boundaries = totals["fours"] + totals["sixes"]
+
+    batting_average = (runs / totals["dismissals"]) if totals["dismissals"] else None
+    batting_strike_rate = (runs / balls) * 100 if balls else None
+    balls_per_boundary = (balls / boundaries) if boundaries else None
+    win_pct = (totals["matches_won"] / totals["matches"]) * 100 if totals["matches"] else None
+
+    return {
+        "matches": totals["matches"],
+        "innings": totals["innings"],
+        "runs_scored": runs,
+        "balls_faced": balls,
+        "fours": totals["fours"],
+        "sixes": totals["sixes"],
+        "highest_score": totals["highest_score"],
+        "batting_average": round(batting_average, 2) if batting_average else None,
+        "batting_strike_rate": round(batting_strike_rate, 2) if batting_strike_rate else None,
+        "thirties": totals["thirties"],
+        "fifties": totals["fifties"],
+        "hundreds": totals["hundreds"],
+        "thirties_plus": totals["thirties_plus"],
+        "balls_per_boundary": round(balls_per_boundary, 2) if balls_per_boundary else None,
+        "ducks": totals["ducks"],
+        "matches_won": totals["matches_won"],
+        "win_pct": round(win_pct, 2) if win_pct is not None else None
+    }
+
+
+def bowling_stats_from_totals(totals: dict):
+    balls, runs, wickets = totals["balls_bowled"], totals["runs_conceded"], totals["wickets_taken"]
+    best_bowling = None
+    if totals["best_bowling"] is not None:
+        best_wickets, best_runs = decode_bowling_figures(totals["best_bowling"])
+        best_bowling = f"{best_wickets}/{best_runs}"
+
+    bowling_average = (runs / wickets) if wickets else None
+    economy_rate = (runs / balls)*6 if balls else None
+    bowling_strike_rate = (balls / wickets) if wickets else None
+    dismissals = totals["catches"] + totals["runouts"]
+    dismissals_per_match = round(dismissals / totals["matches"], 2) if totals["matches"] else None
+
+    return {
+        "matches": totals["matches"],
+        "innings": totals["innings"],
+        "overs_bowled": (balls//6) + (balls%6)/10,
+        "runs_conceded": runs,
+        "wickets_taken": wickets,
+        "best_bowling": best_bowling,
+        "three_fers": totals["three_fers"],
+        "five_fers": totals["five_fers"],
+        "bowling_average": round(bowling_average, 2) if bowling_average else None,
+        "bowling_strike_rate": round(bowling_strike_rate, 2) if bowling_strike_rate else None,
+        "economy_rate": round(economy_rate, 2) if economy_rate else None,
+        "catches": totals["catches"],
+        "runouts": totals["runouts"],
+        "stumpings": totals["stumpings"],
+        "dismissals_per_match": dismissals_per_match
+    }
+
+
+def _count_if(condition):
+    return func.count(case((condition, 1)))
+
+
+def _sum(column):
+    return func.coalesce(func.sum(column), 0)
+
+
+def batting_totals_columns():
+    runs = Match.runs_scored
+    return [
+        func.count(Match.match_id).label("matches"),
+        _count_if(Match.came_to_bat == YesorNo.YES).label("innings"),
+        _sum(runs).label("runs_scored"),
+        _sum(Match.balls_faced).label("balls_faced"),
+        _sum(Match.fours).label("fours"),
+        _sum(Match.sixes).label("sixes"),
+        func.coalesce(func.max(runs), 0).label("highest_score"),
+        _count_if(Match.out == YesorNo.YES).label("dismissals"),
+        _count_if(and_(Match.out == YesorNo.YES, runs == 0)).label("ducks"),
+        _count_if(and_(runs > 29, runs < 50)).label("thirties"),
+        _count_if(and_(runs > 49, runs < 100)).label("fifties"),
+        _count_if(runs > 99).label("hundreds"),
+        _count_if(runs > 29).label("thirties_plus"),
+        _count_if(Match.match_result == MatchResult.WON).label("matches_won"),
+    ]
+
+
+def bowling_totals_columns():
+    wickets = Match.wickets
+    return [
+        func.count(Match.match_id).label("matches"),
+        _count_if(Match.balls_bowled > 0).label("innings"),
+        _sum(Match.balls_bowled).label("balls_bowled"),
+        _sum(Match.runs_conceded).label("runs_conceded"),
+        _sum(wickets).label("wickets_taken"),
+        _count_if(and_(wickets > 2, wickets < 5)).label("three_fers"),
+        _count_if(wickets > 4).label("five_fers"),
+        func.max(case((wickets > 0, wickets * BOWLING_FIGURES_SCALE - Match.runs_conceded))).label("best_bowling"),
+        _sum(Match.catches).label("catches"),
+        _sum(Match.run_outs).label("runouts"),
+        _sum(Match.stumpings).label("stumpings"),
+    ]
+
+
+def _aggregate(db: Session, user_id: int, columns, group_by=None, filters=()):
+    if group_by is None:
+        row = db.query(*columns).filter(Match.user_id == user_id, *filters).one()
+        return dict(row._mapping)
+
+    labels = [column.name for column in columns]
+    rows = db.query(group_by, *columns).filter(Match.user_id == user_id, *filters).group_by(group_by).all()
+    return [(row[0], dict(zip(labels, row[1:]))) for row in rows]
+
+
+def sql_batting_totals(db: Session, user_id: int, group_by=None, filters=()):
+    """Batting totals computed by the database in a single aggregate query.
+
+    Returns one totals dict, or (key, totals) pairs when `group_by` is a column.
+    Extra `filters` narrow the user's matches further.
+    """
+    return _aggregate(db, user_id, batting_totals_columns(), group_by, filters)
+
+
+def sql_bowling_totals(db: Session, user_id: int, group_by=None, filters=()):
+    """Bowling counterpart of sql_batting_totals()."""
+    return _aggregate(db, user_id, bowling_totals_columns(), group_by, filters)
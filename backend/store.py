@@ -0,0 +1,192 @@
+"""Key-value state that every worker process can see: data versions, shared
+cache entries and rate-limit buckets.
+
+SHARED_STORE_URL picks the backend:
+
+- ``memory://`` (the default) keeps everything in this process. Right for a
+  single uvicorn worker; with several, each one has its own versions and
+  buckets.
+- ``sqlite:///path/to/shared.db`` keeps it in a SQLite file that all workers on
+  the host open. WAL mode lets readers run alongside a writer, and counters and
+  token buckets are updated inside one transaction, so they stay exact across
+  processes. Point every worker (and `python -m backend.rollups` etc., if
+  they should invalidate caches) at the same file.
+
+Values are SQLite scalars: int, float, str or bytes.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy.engine import make_url
+from .config import settings
+
+PURGE_EVERY = 1000    # writes between sweeps of expired entries and refilled buckets
+
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: float):
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+class MemoryStore:
+    """Process-local store (see module docstring)."""
+
+    shared = False
+
+    def __init__(self):
+        self._entries = {}     # key -> (value, expires_at or None)
+        self._buckets = {}     # key -> (tokens, updated_at, full_at)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key: str, value, ttl: float = None):
+        with self._lock:
+            self._entries[key] = (value, None if ttl is None else time.time() + ttl)
+            self._purge_sometimes()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str):
+        with self._lock:
+            value = (self.get(key) or 0) + 1
+            self._entries[key] = (value, None)
+            return value
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1):
+        """Take `cost` tokens from the bucket; returns 0.0, or the seconds until they'd be available."""
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = burst if bucket is None else refill(bucket[0], bucket[1], now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            self._purge_sometimes()
+            return wait
+
+    def _purge_sometimes(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY:
+            return
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at is not None and expires_at < now]:
+            del self._entries[key]
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at < now]:
+            del self._buckets[key]
+
+
+class SQLiteStore:
+    """Store in a SQLite file shared by every worker on the host (see module docstring)."""
+
+    shared = True
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value, expires_at REAL) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+
+    def _connection(self):
+        # One connection per thread, and never one inherited across a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front, so read-modify-write can't interleave
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get(self, key: str):
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key: str, value, ttl: float = None):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, None if ttl is None else time.time() + ttl),
+        )
+        self._purge_sometimes()
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def incr(self, key: str):
+        return self._connection().execute(
+            "INSERT INTO entries (key, value) VALUES (?, 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = value + 1, expires_at = NULL RETURNING value",
+            (key,),
+        ).fetchone()[0]
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1):
+        """Take `cost` tokens from the bucket; returns 0.0, or the seconds until they'd be available."""
+        with self._transaction() as connection:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else refill(row[0], row[1], now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) / rate),
+            )
+        self._purge_sometimes()
+        return wait
+
+    def _purge_sometimes(self):
+        # Per process; each worker sweeps now and then, which is plenty
+        self._writes += 1
+        if self._writes % PURGE_EVERY:
+            return
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+            connection.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+
+
+def create_store(url: str):
+    if url == "memory://":
+        return MemoryStore()
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database:
+        return SQLiteStore(parsed.database)
+    raise ValueError(f"Unsupported SHARED_STORE_URL {url!r}: use memory:// or sqlite:///path")
+
+
+store = create_store(settings.shared_store_url)
@@ -0,0 +1,56 @@
+"""Synthetic users and matches for benchmarks and query plan checks."""
+import random
+from datetime import date, timedelta
+from types import SimpleNamespace
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .models import User, Match, YesorNo, InningType, MatchResult
+from .rollups import add_matches
+from .stats import overs_to_balls
+
+GROUNDS = ["Lords", "Oval", "Eden Gardens", "MCG", "Wankhede", "Newlands", "Basin Reserve", "Gabba"]
+
+
+def random_match(rng: random.Random, user_id: int = None):
+    """Column values for one plausible match."""
+    batted = rng.random() < 0.8
+    overs = rng.choice([0.0, 1.0, 2.3, 3.5, 4.0, 10.0])
+    return {
+        "user_id": user_id,
+        "date": date(2018, 1, 1) + timedelta(days=rng.randrange(2500)),
+        "ground": rng.choice(GROUNDS),
+        "came_to_bat": YesorNo.YES if batted else YesorNo.NO,
+        "batting_position": rng.randint(1, 11) if batted else None,
+        "runs_scored": rng.randint(0, 120) if batted else None,
+        "balls_faced": rng.randint(0, 90) if batted else None,
+        "fours": rng.randint(0, 10) if batted else None,
+        "sixes": rng.randint(0, 5) if batted else None,
+        "out": rng.choice([YesorNo.YES, YesorNo.NO]) if batted else None,
+        "match_inning": rng.choice(list(InningType)),
+        "catches": rng.randint(0, 2),
+        "run_outs": rng.randint(0, 1),
+        "stumpings": 0,
+        "overs_bowled": overs,
+        "balls_bowled": overs_to_balls(overs),
+        "runs_conceded": rng.randint(0, 60),
+        "wickets": rng.randint(0, 5),
+        "wides": rng.randint(0, 3),
+        "no_balls": rng.randint(0, 2),
+        "match_result": rng.choice(list(MatchResult)),
+    }
+
+
+def seed_user(db: Session, username: str, matches: int, rng: random.Random, hashed_password: str = "-", rollups: bool = False):
+    """Insert one user with `matches` random matches; returns the user id.
+
+    With `rollups` the user's stats rollups are built too, as a real import would.
+    """
+    user = User(username=username, email=f"{username}@example.com", hashed_password=hashed_password)
+    db.add(user)
+    db.flush()
+    rows = [random_match(rng, user.id) for _ in range(matches)]
+    if rows:
+        db.execute(insert(Match), rows)
+        if rollups:
+            add_matches(db, [SimpleNamespace(**row) for row in rows])
+    return user.id
@@ -1,10 +1,112 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext  # For password hashing
+from .config import settings
+from .metrics import charge_thread_cpu
 
-# Password hashing utility
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+
+# Password hashing utility. Pinning min/max rounds to the configured cost makes
+# passlib flag any hash made with a different cost for re-hashing on next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify jobs are already waiting for a worker."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so async routes never block the event loop.
+
+    bcrypt releases the GIL, so `workers` threads give that many hashes in
+    parallel. At most `max_queue` jobs may wait for a worker; beyond that new
+    jobs are rejected with PasswordHasherBusy instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.queued += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+                self.total_wait_seconds += started - submitted
+                self.max_wait_seconds = max(self.max_wait_seconds, started - submitted)
+            try:
+                return charge_thread_cpu(fn)(*args)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    self.total_run_seconds += time.perf_counter() - started
+
+        # In a copy of the caller's context, so the request gets charged for the CPU
+        return await asyncio.get_running_loop().run_in_executor(self._executor, contextvars.copy_context().run, job)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_queue)
+
+async def hash_password(password: str):
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Returns (is_valid, new_hash). new_hash is set when the stored hash uses an outdated cost."""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def hash_passwords(passwords):
+    """Hash a batch in parallel, keeping no more jobs queued than there are workers."""
+    semaphore = asyncio.Semaphore(password_hasher.workers)
+
+    async def hash_one(password: str):
+        async with semaphore:
+            return await hash_password(password)
+
+    return await asyncio.gather(*(hash_one(password) for password in passwords))
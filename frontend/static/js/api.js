@@ -95,12 +95,11 @@ class ApiClient {
         });
     }
     
-    static async getBattingStats() {
-        return this.authenticatedRequest('/bat_stats/summary');
-    }
-    
-    static async getBattingDetailedStats() {
-        return this.authenticatedRequest('/bat_stats/detailed');
+    // Batting, bowling and breakdown stats in one request; `fields` picks
+    // sections or section.field names, e.g. 'batting.runs_scored,bowling'
+    static async getDashboard(fields) {
+        const query = fields ? `?fields=${encodeURIComponent(fields)}` : '';
+        return this.authenticatedRequest(`/dashboard${query}`);
     }
 }
 
@@ -60,10 +60,25 @@ function setupLogout() {
     }
 }
 
+// Everything the overview, batting and bowling sections render, fetched in one request
+const DASHBOARD_FIELDS = [
+    'batting.matches', 'batting.innings', 'batting.runs_scored', 'batting.batting_average',
+    'batting.batting_strike_rate', 'batting.highest_score', 'batting.fifties', 'batting.hundreds',
+    'bowling.innings', 'bowling.wickets_taken', 'bowling.economy_rate', 'bowling.best_bowling'
+].join(',');
+
+let dashboardStats = null;
+
 async function loadDashboardData() {
     try {
-        // Load overview stats
-        await loadOverviewStats();
+        const response = await AuthManager.apiRequest(`/api/v1/dashboard?fields=${DASHBOARD_FIELDS}`);
+        
+        if (response.ok) {
+            dashboardStats = await response.json();
+            loadOverviewStats();
+        } else {
+            showError('Failed to load dashboard data. Please refresh the page.');
+        }
         
     } catch (error) {
         console.error('Failed to load dashboard data:', error);
@@ -71,29 +86,14 @@ async function loadDashboardData() {
     }
 }
 
-async function loadOverviewStats() {
-    try {
-        // Example API calls - adjust based on your actual endpoints
-        const statsResponse = await AuthManager.apiRequest('/api/v1/bat_stats/summary');
-        
-        if (statsResponse.ok) {
-            const stats = await statsResponse.json();
-            
-            // Update overview cards
-            updateStatCard('totalMatches', stats.total_matches || 0);
-            updateStatCard('totalRuns', stats.total_runs || 0);
-            updateStatCard('battingAverage', (stats.batting_average || 0).toFixed(2));
-            updateStatCard('strikeRate', (stats.strike_rate || 0).toFixed(2));
-        }
-        
-    } catch (error) {
-        console.error('Failed to load overview stats:', error);
-        // Set default values on error
-        updateStatCard('totalMatches', 0);
-        updateStatCard('totalRuns', 0);
-        updateStatCard('battingAverage', '0.00');
-        updateStatCard('strikeRate', '0.00');
-    }
+function loadOverviewStats() {
+    const stats = dashboardStats.batting;
+    
+    // Update overview cards
+    updateStatCard('totalMatches', stats.matches || 0);
+    updateStatCard('totalRuns', stats.runs_scored || 0);
+    updateStatCard('battingAverage', (stats.batting_average || 0).toFixed(2));
+    updateStatCard('strikeRate', (stats.batting_strike_rate || 0).toFixed(2));
 }
 
 function updateStatCard(elementId, value) {
@@ -125,11 +125,11 @@ async function loadSectionData(section) {
 
 async function loadMatches() {
     try {
-        const response = await AuthManager.apiRequest('/api/v1/matches');
+        const response = await AuthManager.apiRequest('/api/v1/matches/get_matches_page');
         
         if (response.ok) {
-            const matches = await response.json();
-            displayMatches(matches);
+            const page = await response.json();
+            displayMatches(page.matches);
         } else {
             showError('Failed to load matches');
         }
@@ -161,19 +161,9 @@ function displayMatches(matches) {
 }
 
 async function loadBattingStats() {
-    try {
-        const response = await AuthManager.apiRequest('/api/v1/bat_stats/detailed');
-        
-        if (response.ok) {
-            const stats = await response.json();
-            displayBattingStats(stats);
-        } else {
-            showError('Failed to load batting stats');
-        }
-        
-    } catch (error) {
-        console.error('Failed to load batting stats:', error);
-        showError('Failed to load batting stats. Please try again.');
+    // Already fetched with the rest of the dashboard
+    if (dashboardStats) {
+        displayBattingStats(dashboardStats.batting);
     }
 }
 
@@ -204,11 +194,30 @@ function displayBattingStats(stats) {
 }
 
 async function loadBowlingStats() {
-    // Similar implementation for bowling stats
     const bowlingStats = document.getElementById('bowlingStats');
-    if (bowlingStats) {
-        bowlingStats.innerHTML = '<p>Bowling stats will be implemented soon!</p>';
-    }
+    if (!bowlingStats || !dashboardStats) return;
+    
+    const stats = dashboardStats.bowling;
+    bowlingStats.innerHTML = `
+        <div class="stats-grid">
+            <div class="stat-card">
+                <h3>Innings</h3>
+                <p class="stat-number">${stats.innings || 0}</p>
+            </div>
+            <div class="stat-card">
+                <h3>Wickets</h3>
+                <p class="stat-number">${stats.wickets_taken || 0}</p>
+            </div>
+            <div class="stat-card">
+                <h3>Economy</h3>
+                <p class="stat-number">${(stats.economy_rate || 0).toFixed(2)}</p>
+            </div>
+            <div class="stat-card">
+                <h3>Best Bowling</h3>
+                <p class="stat-number">${stats.best_bowling || '-'}</p>
+            </div>
+        </div>
+    `;
 }
 
 async function loadAnalytics() {
@@ -0,0 +1,82 @@
+"""Measure per-request auth overhead: full JWT verification vs the token cache.
+
+    python -m scripts.bench_auth [--algorithm RS256] [--iterations 20000]
+
+Runs get_current_user(), the dependency every authenticated route resolves,
+directly, so the numbers are its own cost without HTTP around it. A cache
+miss, with the cache cleared before every call, is the full verification
+every request paid before the cache. With an RS/ES algorithm a throwaway key
+pair is generated and wired up through JWT_PRIVATE_KEY_FILE /
+JWT_PUBLIC_KEYS_FILE.
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+
+def configure(algorithm: str):
+    os.environ["ALGORITHM"] = algorithm
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    if algorithm.startswith(("RS", "ES")):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+        private = rsa.generate_private_key(65537, 2048) if algorithm.startswith("RS") else ec.generate_private_key(ec.SECP256R1())
+        keys = tempfile.mkdtemp()
+        with open(os.path.join(keys, "private.pem"), "wb") as f:
+            f.write(private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+        with open(os.path.join(keys, "public.json"), "w") as f:
+            public = private.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+            json.dump({"bench": public.decode()}, f)
+        os.environ["JWT_PRIVATE_KEY_FILE"] = os.path.join(keys, "private.pem")
+        os.environ["JWT_PUBLIC_KEYS_FILE"] = os.path.join(keys, "public.json")
+        os.environ["JWT_KEY_ID"] = "bench"
+
+
+def per_call_us(fn, iterations: int):
+    return min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--algorithm", default="HS256")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+    configure(args.algorithm)
+
+    from fastapi import HTTPException
+    from backend.api import jwt
+
+    token = jwt.create_access_token({"user_id": 1})
+    garbage = "not-a-jwt" * 20
+
+    def cached():
+        jwt.get_current_user(token)
+
+    def cache_miss():
+        jwt.token_cache.clear()
+        jwt.get_current_user(token)
+
+    def reject(fn):
+        def run():
+            try:
+                fn()
+            except HTTPException:
+                pass
+        return run
+
+    results = {
+        "get_current_user, cache miss": per_call_us(cache_miss, args.iterations),
+        "get_current_user, cache hit": per_call_us(cached, args.iterations),
+        "malformed token, shape check": per_call_us(reject(lambda: jwt.get_current_user(garbage)), args.iterations),
+    }
+    print(f"{args.algorithm}, {args.iterations} calls per run, best of 3")
+    for name, us in results.items():
+        print(f"  {name:<32} {us:9.2f} us/call")
+    print(f"  cache hit speedup: {results['get_current_user, cache miss'] / results['get_current_user, cache hit']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare the validated and the direct read paths for match lists, per 1k matches.
+
+    python -m scripts.bench_serialization [--sizes 1000 10000] [--seed 0]
+
+"validated" is what FastAPI does for a route returning ORM objects with
+response_model=list[MatchResponse]: load the objects, validate each one with
+from_attributes, dump it in JSON mode and json.dumps the result. "direct" is
+backend.responses: select the columns as tuples, zip them into dicts and
+encode them with orjson. Both bodies are checked to decode to the same data
+before anything is timed. Times are the best of 3 runs, scaled to 1k matches,
+for the whole path and for serialization alone.
+"""
+import argparse
+import json
+import os
+import random
+import timeit
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from backend.database import Base
+from backend.models import Match
+from backend.responses import select_match_rows, match_rows
+from backend.schemas import MatchResponse
+from backend.synthetic import seed_user
+
+MATCH_LIST = TypeAdapter(list[MatchResponse])
+
+
+def validated_body(matches):
+    # FastAPI's serialize_response() followed by JSONResponse.render()
+    value = MATCH_LIST.validate_python(matches, from_attributes=True)
+    content = MATCH_LIST.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def direct_body(rows):
+    return orjson.dumps(match_rows(rows))
+
+
+def per_1k_ms(fn, size: int, number: int = 3):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1000 * 1000 / size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time match list serialization, validated vs direct")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000], help="matches per user to time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    print(f"{'matches':>8} {'validated':>10} {'direct':>8} {'speedup':>8}   {'serialize only:':<16} {'validated':>10} {'direct':>8} {'speedup':>8}   (ms per 1k matches)")
+    for size in args.sizes:
+        with Session(engine) as db:
+            user_id = seed_user(db, f"serialization-{size}", size, rng)
+            db.commit()
+            statement = select_match_rows(Match.user_id == user_id)
+
+            def load_matches():
+                matches = db.query(Match).filter(Match.user_id == user_id).all()
+                db.expunge_all()
+                return matches
+
+            matches, rows = load_matches(), db.execute(statement).all()
+            if json.loads(validated_body(matches)) != orjson.loads(direct_body(rows)):
+                raise SystemExit(f"{size} matches: the direct body differs from the validated one")
+
+            full_before = per_1k_ms(lambda: validated_body(load_matches()), size)
+            full_after = per_1k_ms(lambda: direct_body(db.execute(statement).all()), size)
+            only_before = per_1k_ms(lambda: validated_body(matches), size)
+            only_after = per_1k_ms(lambda: direct_body(rows), size)
+        print(f"{size:>8} {full_before:>10.2f} {full_after:>8.2f} {full_before / full_after:>7.1f}x   {'':<16} "
+              f"{only_before:>10.2f} {only_after:>8.2f} {only_before / only_after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
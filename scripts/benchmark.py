@@ -0,0 +1,421 @@
+"""Load-test every API router in-process and record latency, throughput and query counts.
+
+Seed a database, then drive the app through its ASGI interface with concurrent
+clients and save the results:
+
+    python -m scripts.benchmark run --users 10000 --matches 1000 --output before.json
+    python -m scripts.benchmark run --skip-seed --output after.json
+    python -m scripts.benchmark compare before.json after.json
+
+`run` points DATABASE_URL at --url (a throwaway SQLite file by default) before
+the app is imported. `compare` exits non-zero when any endpoint's p95 latency
+got worse by more than --threshold, so it can gate a CI job.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+DEFAULT_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "crictracker-bench.sqlite")
+USER_PREFIX = "bench-user-"
+PASSWORD = "bench-password"
+ADMIN_USERNAME = USER_PREFIX + "0"
+IMPORT_ROWS = 100
+BATCH_MATCHES = 5        # match ids per batch update / delete
+PROVISION_USERS = 5      # accounts per provisioning request, each a bcrypt hash
+# Scenarios whose responses are kept for later ones, and the id they are kept by
+CREATES = {"POST /matches/add_match": "match_id", "POST /seasons/add_season": "season_id"}
+
+
+def configure(url: str):
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ADMIN_USERNAMES", ADMIN_USERNAME)
+    # Every simulated client shares one address; measure the auth handlers, not the limiter
+    for name in ("LOGIN_RATE_PER_MINUTE", "LOGIN_IP_RATE_PER_MINUTE", "REGISTER_RATE_PER_MINUTE"):
+        os.environ.setdefault(name, "0")
+
+
+def seed(users: int, matches: int, rng: random.Random):
+    from sqlalchemy import delete
+    import backend.main  # noqa: F401  (creates the tables)
+    from backend.database import SessionLocal
+    from backend.models import (
+        User, Match, BallChunk, Season, PlayerCareerStats, PlayerGroupStats, PlayerSeasonStats, LeaderboardEntry, LeaderboardDirtyUser,
+    )
+    from backend.leaderboards import refresh_all
+    from backend.synthetic import seed_user
+    from backend.utils import get_password_hash
+
+    hashed_password = get_password_hash(PASSWORD)
+    db = SessionLocal()
+    try:
+        # Start from a clean slate so repeated seeding doesn't pile up rows
+        old_ids = [row[0] for row in db.query(User.id).filter(User.username.like(USER_PREFIX + "%"))]
+        old_matches = db.query(Match.match_id).filter(Match.user_id.in_(old_ids)).scalar_subquery()
+        db.execute(delete(BallChunk).where(BallChunk.match_id.in_(old_matches)))
+        for model, column in ((Match, Match.user_id), (PlayerSeasonStats, PlayerSeasonStats.user_id), (Season, Season.user_id),
+                              (PlayerCareerStats, PlayerCareerStats.user_id),
+                              (PlayerGroupStats, PlayerGroupStats.user_id), (LeaderboardEntry, LeaderboardEntry.user_id),
+                              (LeaderboardDirtyUser, LeaderboardDirtyUser.user_id), (User, User.id)):
+            db.execute(delete(model).where(column.in_(old_ids)))
+        db.commit()
+
+        started = time.perf_counter()
+        for i in range(users):
+            seed_user(db, f"{USER_PREFIX}{i}", matches, rng, hashed_password=hashed_password, rollups=True)
+            if (i + 1) % 50 == 0 or i + 1 == users:
+                db.commit()
+                print(f"\rseeded {i + 1}/{users} users", end="", file=sys.stderr)
+        print(f" in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        refresh_all(db)
+    finally:
+        db.close()
+
+
+def load_users():
+    from backend.database import SessionLocal
+    from backend.models import User
+
+    db = SessionLocal()
+    try:
+        return [(row.id, row.username) for row in db.query(User.id, User.username).filter(User.username.like(USER_PREFIX + "%"))]
+    finally:
+        db.close()
+
+
+class QueryCounter:
+    """Counts statements sent through the app's engines."""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in {id(engine): engine for engine in engines}.values():
+            event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, *args):
+        self.count += 1
+
+
+def percentile(samples, pct: int):
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def scenarios(users, tokens, rng: random.Random, created: dict):
+    """(router, name, request builder, pool) per endpoint.
+
+    A builder returns (method, path, httpx kwargs). `pool` names the list in
+    `created` that the builder draws on (see CREATES), or is None.
+    """
+    from backend.synthetic import random_match
+    from backend.leaderboards import METRICS
+    from backend.main import app
+
+    def auth():
+        user_id = rng.choice(users)[0]
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    def match_json():
+        match = random_match(rng)
+        del match["user_id"]
+        return json.loads(json.dumps(match, default=lambda value: getattr(value, "value", None) or value.isoformat()))
+
+    def import_file():
+        body = "".join(json.dumps(match_json()) + "\n" for _ in range(IMPORT_ROWS))
+        return {"file": ("bench.ndjson", body.encode(), "application/x-ndjson")}
+
+    def login():
+        return "POST", "/api/v1/auth/login", {"data": {"username": rng.choice(users)[1], "password": PASSWORD}}
+
+    registered = iter(range(10**9))
+
+    def register():
+        name = f"bench-register-{os.getpid()}-{time.time_ns()}-{next(registered)}"
+        return "POST", "/api/v1/auth/register", {"json": {"username": name, "email": f"{name}@example.com", "password": PASSWORD}}
+
+    def created_match():
+        return created["match_id"].pop(rng.randrange(len(created["match_id"])))
+
+    def created_batch(consume: bool):
+        # Up to BATCH_MATCHES of one user's added matches
+        match_id, headers = rng.choice(created["match_id"])
+        batch = [entry for entry in created["match_id"] if entry[1] == headers][:BATCH_MATCHES]
+        if consume:
+            for entry in batch:
+                created["match_id"].remove(entry)
+        return [entry[0] for entry in batch], headers
+
+    yield "auth", "POST /auth/login", login, None
+    yield "auth", "POST /auth/register", register, None
+    yield "matches", "POST /matches/add_match", lambda: ("POST", "/api/v1/matches/add_match", {"json": match_json(), "headers": auth()}), None
+    yield "matches", "POST /matches/import_matches", lambda: ("POST", "/api/v1/matches/import_matches", {"files": import_file(), "headers": auth()}), None
+    yield "matches", "GET /matches/get_all_matches", lambda: ("GET", "/api/v1/matches/get_all_matches", {"headers": auth()}), None
+    yield "matches", "GET /matches/get_matches_page", lambda: ("GET", "/api/v1/matches/get_matches_page", {"params": {"limit": 50}, "headers": auth()}), None
+    yield "matches", "GET /matches/export_matches", lambda: ("GET", "/api/v1/matches/export_matches", {"headers": auth()}), None
+
+    def get_created():
+        match_id, headers = rng.choice(created["match_id"])
+        return "GET", f"/api/v1/matches/get_match/{match_id}", {"headers": headers}
+
+    def update_created():
+        match_id, headers = rng.choice(created["match_id"])
+        return "PATCH", f"/api/v1/matches/update_match/{match_id}", {"json": {"runs_scored": rng.randint(0, 150)}, "headers": headers}
+
+    def update_batch():
+        match_ids, headers = created_batch(consume=False)
+        return "PATCH", "/api/v1/matches/update_matches", {"json": {"match_ids": match_ids, "changes": {"wickets": rng.randint(0, 5)}}, "headers": headers}
+
+    def over():
+        balls = []
+        for _ in range(6):
+            runs = rng.choice([0, 0, 1, 1, 2, 4, 6])
+            balls.append({"role": "batting", "runs": runs, "boundary": runs in (4, 6)})
+        return balls
+
+    def add_balls():
+        match_id, headers = rng.choice(created["match_id"])
+        return "POST", f"/api/v1/matches/add_balls/{match_id}", {"json": {"balls": over()}, "headers": headers}
+
+    def get_balls():
+        match_id, headers = rng.choice(created["match_id"])
+        return "GET", f"/api/v1/matches/get_balls/{match_id}", {"headers": headers}
+
+    def delete_batch():
+        match_ids, headers = created_batch(consume=True)
+        return "POST", "/api/v1/matches/delete_matches", {"json": {"match_ids": match_ids}, "headers": headers}
+
+    def delete_created():
+        match_id, headers = created_match()
+        return "DELETE", f"/api/v1/matches/delete_match/{match_id}", {"headers": headers}
+
+    yield "matches", "GET /matches/get_match/{id}", get_created, "match_id"
+    yield "matches", "PATCH /matches/update_match/{id}", update_created, "match_id"
+    yield "matches", "PATCH /matches/update_matches", update_batch, "match_id"
+    yield "matches", "POST /matches/add_balls/{id}", add_balls, "match_id"
+    yield "matches", "GET /matches/get_balls/{id}", get_balls, "match_id"
+    yield "matches", "POST /matches/delete_matches", delete_batch, "match_id"
+    yield "matches", "DELETE /matches/delete_match/{id}", delete_created, "match_id"
+
+    seasons = iter(range(10**9))
+
+    def add_season():
+        name = f"bench-season-{os.getpid()}-{time.time_ns()}-{next(seasons)}"
+        season = {"name": name, "kind": rng.choice(["season", "tournament"]), "start_date": "2018-01-01", "end_date": "2024-12-31"}
+        return "POST", "/api/v1/seasons/add_season", {"json": season, "headers": auth()}
+
+    def season_action(action):
+        def build():
+            season_id, headers = rng.choice(created["season_id"])
+            return "POST", f"/api/v1/seasons/{action}/{season_id}", {"headers": headers}
+        return build
+
+    yield "seasons", "POST /seasons/add_season", add_season, None
+    yield "seasons", "GET /seasons/get_seasons", lambda: ("GET", "/api/v1/seasons/get_seasons", {"headers": auth()}), None
+    # Closing freezes the season's stats, reopening drops them; either works on an open or closed season
+    yield "seasons", "POST /seasons/close_season/{id}", season_action("close_season"), "season_id"
+    yield "seasons", "POST /seasons/reopen_season/{id}", season_action("reopen_season"), "season_id"
+
+    admin_id = next((user_id for user_id, username in users if username == ADMIN_USERNAME), None)
+
+    def provision():
+        names = [f"bench-provision-{os.getpid()}-{time.time_ns()}-{next(registered)}" for _ in range(PROVISION_USERS)]
+        accounts = [{"username": name, "email": f"{name}@example.com", "password": PASSWORD} for name in names]
+        return "POST", "/api/v1/auth/provision_users", {"json": {"users": accounts}, "headers": {"Authorization": f"Bearer {tokens[admin_id]}"}}
+
+    if admin_id is not None:
+        yield "auth", "POST /auth/provision_users", provision, None
+
+    yield "dashboard", "GET /dashboard", lambda: ("GET", "/api/v1/dashboard", {"headers": auth()}), None
+    yield "leaderboards", "GET /leaderboards/get_leaderboard", lambda: (
+        "GET", "/api/v1/leaderboards/get_leaderboard",
+        {"params": {"metric": rng.choice(list(METRICS)), "limit": 10}, "headers": auth()}), None
+
+    # Every stats endpoint, so new ones are benchmarked without touching this file
+    for route in app.routes:
+        path = getattr(route, "path", "")
+        if path.startswith(("/api/v1/bat_stats/", "/api/v1/ball_stats/", "/api/v1/form/")) and "GET" in route.methods and "{" not in path:
+            yield path.split("/")[3], "GET " + path.removeprefix("/api/v1"), lambda path=path: ("GET", path, {"headers": auth()}), None
+
+
+async def drive(client, build, requests: int, concurrency: int, queries: QueryCounter, on_response=None):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        method, path, kwargs = build()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+        elif on_response:
+            on_response(response, kwargs)
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies_ms), 2),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "queries_per_request": round((queries.count - queries_before) / requests, 2),
+    }
+
+
+async def run_benchmark(args, users):
+    import httpx
+    from backend import database
+    from backend.api.jwt import create_access_token
+    from backend.main import app
+
+    rng = random.Random(args.seed)
+    tokens = {user_id: create_access_token({"user_id": user_id}) for user_id, _ in users}
+    queries = QueryCounter([database.engine, database.read_engine, database.async_engine.sync_engine])
+    created = {key: [] for key in CREATES.values()}
+    results = {}
+
+    def remember_created(key):
+        def remember(response, kwargs):
+            created[key].append((response.json()[key], kwargs["headers"]))
+        return remember
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for router, name, build, pool in scenarios(users, tokens, rng, created):
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                requests = args.auth_requests if router == "auth" else args.requests
+                if pool is not None:
+                    if not created[pool]:
+                        continue
+                    # Deletes consume the matches added earlier, a batch delete up to BATCH_MATCHES each
+                    requests = min(requests, len(created[pool]) // (BATCH_MATCHES if name == "POST /matches/delete_matches" else 1))
+                    if not requests:
+                        continue
+                on_response = remember_created(CREATES[name]) if name in CREATES else None
+                result = await drive(client, build, requests, args.concurrency, queries, on_response)
+                results[name] = dict(router=router, **result)
+                print(f"{name:<48} p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms"
+                      f"  {result['throughput_rps']:8.1f} req/s  {result['queries_per_request']:6.2f} q/req"
+                      + (f"  {result['errors']} errors" if result["errors"] else ""), file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    configure(args.url)
+    if not args.skip_seed:
+        seed(args.users, args.matches, random.Random(args.seed))
+    users = load_users()
+    if not users:
+        sys.exit("No benchmark users in the database; run without --skip-seed first")
+
+    results = asyncio.run(run_benchmark(args, users))
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": args.url.split("://")[0],
+            "users": len(users),
+            "matches_per_user": args.matches if not args.skip_seed else None,
+            "concurrency": args.concurrency,
+            "python": sys.version.split()[0],
+        },
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["endpoints"]
+    with open(args.current) as f:
+        current = json.load(f)["endpoints"]
+
+    regressions = []
+    print(f"{'endpoint':<48} {'p50 ms':>18} {'p95 ms':>18} {'req/s':>16} {'q/req':>12}")
+    for name in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[name], current[name]
+        change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif new["queries_per_request"] - old["queries_per_request"] >= 0.5:
+            flag = "  more queries"
+        print(f"{name:<48} {old['p50_ms']:8.2f} -> {new['p50_ms']:7.2f} {old['p95_ms']:8.2f} -> {new['p95_ms']:7.2f}"
+              f" {old['throughput_rps']:7.1f} -> {new['throughput_rps']:6.1f}"
+              f" {old['queries_per_request']:5.1f} -> {new['queries_per_request']:4.1f}{flag}")
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"{name:<48} only in {'baseline' if name in baseline else 'current'}")
+
+    if regressions:
+        print(f"{len(regressions)} endpoint(s) regressed more than {args.threshold:.0%} at p95")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CricTracker API in-process")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, load-test and report")
+    run_parser.add_argument("--url", default=DEFAULT_URL, help=f"database to seed and test (default: {DEFAULT_URL})")
+    run_parser.add_argument("--users", type=int, default=200, help="synthetic users to seed")
+    run_parser.add_argument("--matches", type=int, default=100, help="matches per seeded user")
+    run_parser.add_argument("--skip-seed", action="store_true", help="reuse the users seeded by an earlier run")
+    run_parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    run_parser.add_argument("--auth-requests", type=int, default=50, help="requests per bcrypt-bound auth endpoint")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    run_parser.add_argument("--only", nargs="*", help="only endpoints whose name contains one of these")
+    run_parser.add_argument("--seed", type=int, default=0, help="random seed")
+    run_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+
+    compare_parser = commands.add_parser("compare", help="diff two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 slowdown (default 0.25 = 25%%)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
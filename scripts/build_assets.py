@@ -0,0 +1,153 @@
+"""Build content-hashed, pre-compressed and resized copies of frontend/static.
+
+    python -m scripts.build_assets [--widths 480 960 1600]
+
+Writes frontend/static/dist/ from scratch:
+
+- every source file copied as name.<hash>.ext, which asset_url() links to;
+- .gz (and .br, with the `brotli` package) siblings of text assets, when
+  smaller than the file itself;
+- for JPEG/PNG images, with Pillow installed: width variants narrower than the
+  original, in the source format and in WebP, for asset_srcset();
+- manifest.json mapping each source path to its built files.
+
+Run it as part of a deploy; without it the app still serves the source files
+with ?v=<hash> URLs. Prints page weight before and after.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+
+from backend.assets import STATIC_DIR, DIST_DIR, MANIFEST_PATH, content_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TEXT_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+REPORT_WIDTH = 960
+# Assets each page loads, for the before/after report
+PAGES = {
+    "login": ["css/login.css", "js/auth.js", "js/api.js", "js/login.js", "img/img1.jpg"],
+    "signup": ["css/signup.css", "js/auth.js", "js/api.js", "js/signup.js", "img/img2.avif"],
+    "dashboard": ["js/auth.js", "js/dashboard.js"],
+}
+
+
+def source_files():
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(STATIC_DIR, DIST_DIR))
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            yield os.path.relpath(full_path, STATIC_DIR).replace(os.sep, "/"), full_path
+
+
+def write_dist(relative: str, data: bytes):
+    full_path = os.path.join(STATIC_DIR, DIST_DIR, relative)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(data)
+    return f"{DIST_DIR}/{relative}"
+
+
+def hashed_name(path: str, data: bytes, tag: str = "", extension: str = None):
+    stem, source_extension = os.path.splitext(path)
+    return f"{stem}{tag}.{content_hash(data)}{extension or source_extension}"
+
+
+def precompress(relative: str, data: bytes):
+    """Write .gz / .br siblings that beat the raw file; returns {encoding: size}."""
+    sizes = {}
+    compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(data, quality=11)
+    for encoding, body in compressed.items():
+        if len(body) < len(data):
+            write_dist(relative + (".gz" if encoding == "gzip" else ".br"), body)
+            sizes[encoding] = len(body)
+    return sizes
+
+
+def image_variants(path: str, data: bytes, widths):
+    variants = []
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = IMAGE_FORMATS[os.path.splitext(path)[1].lower()]
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for output_format, extension, options in (
+                (image_format, None, {"quality": JPEG_QUALITY, "optimize": True, "progressive": True} if image_format == "JPEG" else {"optimize": True}),
+                ("WEBP", ".webp", {"quality": WEBP_QUALITY, "method": 6}),
+            ):
+                buffer = io.BytesIO()
+                converted = resized.convert("RGB") if output_format == "JPEG" else resized
+                converted.save(buffer, output_format, **options)
+                body = buffer.getvalue()
+                file = write_dist(hashed_name(path, body, f"-{width}w", extension), body)
+                variants.append({"file": file, "width": width, "format": output_format.lower(), "size": len(body)})
+    return variants
+
+
+def page_weight(files, sizes):
+    return sum(sizes.get(path, 0) for path in files)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build hashed, pre-compressed and resized static assets")
+    parser.add_argument("--widths", type=int, nargs="*", default=[480, 960, 1600], help="image variant widths")
+    args = parser.parse_args(argv)
+
+    shutil.rmtree(os.path.join(STATIC_DIR, DIST_DIR), ignore_errors=True)
+    if brotli is None:
+        print("brotli not installed: writing .gz files only", file=sys.stderr)
+    if Image is None:
+        print("Pillow not installed: skipping image variants", file=sys.stderr)
+
+    manifest, before, after = {}, {}, {}
+    for path, full_path in source_files():
+        with open(full_path, "rb") as f:
+            data = f.read()
+        relative = hashed_name(path, data)
+        entry = {"file": write_dist(relative, data)}
+        before[path] = after[path] = len(data)
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension in TEXT_EXTENSIONS:
+            compressed = precompress(relative, data)
+            if compressed:
+                entry["precompressed"] = compressed
+                after[path] = min(compressed.values())
+        elif extension in IMAGE_FORMATS and Image is not None:
+            entry["variants"] = image_variants(path, data, args.widths)
+            if entry["variants"]:
+                # What a browser picks for a ~960px slot: the widest variant up to that, in its smallest format
+                fitting = [v for v in entry["variants"] if v["width"] <= REPORT_WIDTH] or entry["variants"]
+                width = max(v["width"] for v in fitting)
+                after[path] = min(v["size"] for v in fitting if v["width"] == width)
+        manifest[path] = entry
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print(f"{len(manifest)} assets built into {os.path.join(STATIC_DIR, DIST_DIR)}")
+    print(f"{'page':<10} {'before':>10} {'after':>10}   (bytes on a first visit; repeat visits fetch nothing)")
+    for page, files in PAGES.items():
+        print(f"{page:<10} {page_weight(files, before):>10,} {page_weight(files, after):>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Check that the per-user match queries are served by indexes, not table scans.
+
+Seeds synthetic users and matches inside a transaction that is rolled back at
+the end, runs the same queries the match and stats endpoints issue, and
+EXPLAINs every statement they send. Exits non-zero if any plan reads a whole
+table. Run it after changing a query or an index:
+
+    python -m scripts.check_query_plans                          # throwaway in-memory SQLite
+    python -m scripts.check_query_plans --url postgresql://...   # a local Postgres
+
+On Postgres sequential scans are disabled for the check, so a tiny seeded table
+can't hide a missing index behind a cheap seq scan.
+"""
+import anyio
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import uuid
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, func, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from backend.database import Base
+from backend.models import Match, Season, InningType, MatchResult
+from backend.rollups import DIMENSIONS, rebuild_user, compute_user_rollups, career_counters, group_counters, breakdown_counters
+from backend.stats import sql_batting_totals, sql_bowling_totals
+from backend.form import build_series
+from backend.leaderboards import METRICS, refresh_users, top_entries, user_rank, board_size
+from backend.synthetic import seed_user
+from backend.api.matches import get_matches, get_matches_page, export_matches, get_single_match
+from backend.mutations import update_owned, miss_reasons
+from backend.seasons import season_counters, season_group_counters, freeze_season
+from backend.balls import event_totals, match_values, tail_chunk, append_codes, match_codes
+
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+# Enum breakdowns are read with explicit keys, as the stats endpoints do
+GROUP_KEYS = {"match_inning": list(InningType), "match_result": list(MatchResult)}
+
+
+def seed(db: Session, users: int, matches_per_user: int, rng: random.Random):
+    """Insert `users` users with `matches_per_user` matches each; returns their ids."""
+    tag = uuid.uuid4().hex[:8]
+    return [seed_user(db, f"plan-check-{tag}-{i}", matches_per_user, rng) for i in range(users)]
+
+
+def workloads(db: Session, user_id: int):
+    """(name, callable) for every query path the endpoints take for one user."""
+    user = SimpleNamespace(user_id=user_id)
+    match_id = db.scalar(select(Match.match_id).where(Match.user_id == user_id).limit(1))
+
+    def paging():
+        page = json.loads(get_matches_page(limit=20, cursor=None, db=db, current_user=user).body)
+        get_matches_page(limit=20, cursor=page["next_cursor"], db=db, current_user=user)
+
+    def export():
+        async def drain(response):
+            async for _ in response.body_iterator:
+                pass
+        anyio.run(drain, export_matches(db=db, current_user=user))
+
+    yield "get_all_matches", lambda: get_matches(db=db, current_user=user)
+    yield "get_matches_page", paging
+    yield "export_matches", export
+    yield "get_match", lambda: get_single_match(match_id, db=db, current_user=user)
+    yield "owner-scoped update", lambda: update_owned(db, user_id, [match_id], {"catches": 0})
+    yield "ownership probe", lambda: miss_reasons(db, user_id, [match_id])
+    yield "ball append", lambda: (
+        update_owned(db, user_id, [match_id], match_values(event_totals([0] * 300))),
+        append_codes(db, match_id, tail_chunk(db, match_id), [0] * 300))
+    yield "ball read", lambda: match_codes(db, user_id, match_id)
+    yield "career totals", lambda: (sql_batting_totals(db, user_id), sql_bowling_totals(db, user_id))
+    yield "career rollup", lambda: career_counters(db, user_id)
+    yield "rollup rebuild", lambda: compute_user_rollups(db, user_id)
+    yield "dashboard breakdowns", lambda: breakdown_counters(db, user_id, DIMENSIONS, keys=GROUP_KEYS)
+    yield "form series", lambda: build_series(db, user_id)
+    yield "leaderboard refresh", lambda: (refresh_users(db, [user_id]), db.flush())
+    for metric in METRICS.values():
+        yield f"{metric.name} leaderboard", lambda metric=metric: (
+            top_entries(db, metric, "all", "", 10), user_rank(db, metric, "all", "", user_id), board_size(db, metric, "all", ""))
+    for dimension in DIMENSIONS:
+        column = getattr(Match, dimension)
+        value = db.scalar(select(column).where(Match.user_id == user_id, column.is_not(None)).limit(1))
+        yield f"{dimension} totals", lambda column=column: (
+            sql_batting_totals(db, user_id, group_by=column), sql_bowling_totals(db, user_id, group_by=column))
+        # The filtered form rollups use to recompute a single group
+        yield f"{dimension} group recompute", lambda column=column, value=value: (
+            sql_batting_totals(db, user_id, filters=(column == value,)),
+            sql_bowling_totals(db, user_id, filters=(column == value,)))
+        yield f"{dimension} rollup", lambda dimension=dimension: group_counters(
+            db, user_id, dimension, keys=GROUP_KEYS.get(dimension))
+
+    # One season spanning the user's matches, read live and then frozen
+    start, end = db.execute(select(func.min(Match.date), func.max(Match.date)).where(Match.user_id == user_id)).one()
+    season = Season(user_id=user_id, name="plan-check", start_date=start, end_date=end)
+    db.add(season)
+    db.flush()
+    db.execute(update(Match).where(Match.user_id == user_id).values(season_id=season.season_id))
+    yield "open season totals", lambda: season_counters(db, season)
+    for dimension in DIMENSIONS:
+        yield f"open season {dimension}", lambda dimension=dimension: season_group_counters(
+            db, season, dimension, keys=GROUP_KEYS.get(dimension))
+    yield "close season", lambda: (freeze_season(db, season), db.flush())
+    yield "closed season totals", lambda: season_counters(db, season)
+    yield "closed season breakdown", lambda: season_group_counters(db, season, "ground")
+    yield "closed-season write guard", lambda: update_owned(db, user_id, [match_id], {"catches": 0})
+
+
+def capture_statements(connection, fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            if (statement, parameters) not in statements:
+                statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+    return statements
+
+
+def _postgres_seq_scans(plan):
+    scans = []
+    if plan.get("Node Type") == "Seq Scan":
+        scans.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        scans.extend(_postgres_seq_scans(child))
+    return scans
+
+
+def full_scans(connection, statement: str, parameters):
+    """(tables read in full, plan text) for one statement."""
+    if connection.dialect.name == "postgresql":
+        raw = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+        return _postgres_seq_scans(plan), json.dumps(plan, indent=2)
+
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    details = [row[-1] for row in rows]
+    tables = set(Base.metadata.tables)
+    scans = [match.group(1) for match in map(SQLITE_SCAN.match, details) if match and match.group(1) in tables]
+    return scans, "\n".join(details)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if a match or stats query plan scans a whole table")
+    parser.add_argument("--url", default="sqlite://", help="database to check (default: in-memory SQLite)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--matches", type=int, default=200, help="matches per seeded user")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args(argv)
+
+    url = make_url(args.url)
+    # The export endpoint's generator is driven from a worker thread, as Starlette does
+    connect_args = {"check_same_thread": False} if url.get_backend_name() == "sqlite" else {}
+    engine = create_engine(url, connect_args=connect_args)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            Base.metadata.create_all(connection)
+            db = Session(bind=connection, join_transaction_mode="create_savepoint")
+            user_ids = seed(db, args.users, args.matches, random.Random(args.seed))
+            user_id = user_ids[len(user_ids) // 2]
+            # Rollups for every seeded user, so the planner sees realistic row counts
+            for seeded_id in user_ids:
+                rebuild_user(db, seeded_id)
+            refresh_users(db, user_ids)
+            db.flush()
+            if connection.dialect.name == "postgresql":
+                connection.exec_driver_sql("ANALYZE matches")
+                connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            else:
+                connection.exec_driver_sql("ANALYZE")
+
+            failures = 0
+            for name, fn in workloads(db, user_id):
+                for statement, parameters in capture_statements(connection, fn):
+                    scans, plan = full_scans(connection, statement, parameters)
+                    if scans:
+                        failures += 1
+                        print(f"FAIL {name}: full scan of {', '.join(scans)}\n{statement}\n{plan}\n")
+                    elif args.verbose:
+                        print(f"ok   {name}\n{statement}\n{plan}\n")
+            print(f"{engine.dialect.name}: {failures} statement(s) with full table scans")
+            return 1 if failures else 0
+        finally:
+            transaction.rollback()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""Property checks for the stats rollups, then timings against the old paths.
+
+    python -m scripts.check_rollups [--seed 0] [--cases 200] [--sizes 10000 50000]
+
+Each property runs on --cases match histories drawn from a seeded generator
+that favours the values the totals branch on (milestone boundaries, missing
+values, empty and one-match histories). Case n of a property uses
+random.Random(f"{seed}:{property}:{n}"), so a run is deterministic and a
+failure names the seed that reproduces it. Like Hypothesis, a failing history
+is shrunk before it is reported: matches are dropped while it still fails, then
+each value is swapped for the simplest one that keeps it failing.
+
+- rollups: compute_user_rollups() equals folding stats.add_batting_match() /
+  add_bowling_match() over each row's matches, and the per-breakdown SQL
+  aggregates it replaced (sql_counters() / sql_group_counters()).
+- baseline: for histories without missing values, the stats of every rollup
+  row equal those of the original per-request calc_batting_stats() /
+  calc_bowling_stats(). Those crashed on missing values. They are copied below,
+  minus their unused FastAPI parameters.
+- incremental: writing the history through add_matches() and
+  apply_match_change(), then editing and deleting some of it, leaves no drift
+  against compute_user_rollups().
+
+The timing pass compares, per user size, the baseline (load every Match, fold
+in Python), the per-breakdown SQL aggregates and compute_user_rollups().
+"""
+import argparse
+import enum
+import math
+import os
+import random
+import sys
+import timeit
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from backend.database import Base
+from backend.models import Match, User, YesorNo, InningType, MatchResult
+from backend.rollups import (
+    DIMENSIONS, compute_user_rollups, sql_counters, sql_group_counters, group_key, to_counters,
+    batting_stats, bowling_stats, add_matches, apply_match_change, snapshot, find_drift,
+)
+from backend.stats import empty_batting_totals, empty_bowling_totals, add_batting_match, add_bowling_match, load_user_matches, overs_to_balls
+from backend.synthetic import GROUNDS, random_match
+
+# The values each generated field is drawn from, simplest first: around every
+# threshold the totals care about, plus missing ones (None)
+CHOICES = {
+    "ground": GROUNDS[:3],
+    "came_to_bat": [YesorNo.NO, YesorNo.YES],
+    "batting_position": [None, 1, 2, 11],
+    "runs_scored": [None, 0, 1, 29, 30, 49, 50, 99, 100, 101, 250],
+    "balls_faced": [None, 0, 1, 2, 5, 60, 120],
+    "fours": [None, 0, 1, 2, 5],
+    "sixes": [None, 0, 1, 2, 5],
+    "out": [None, YesorNo.NO, YesorNo.YES],
+    "match_inning": [None, *InningType],
+    "match_result": [None, *MatchResult],
+    "overs_bowled": [None, 0.0, 0.1, 0.5, 1.0, 2.3, 3.5, 4.0, 9.5, 10.0, 19.4, 50.0],
+    "runs_conceded": [None, 0, 1, 17, 45, 80],
+    "wickets": [None, 0, 1, 2, 3, 4, 5, 6, 10],
+    "catches": [None, 0, 1, 2, 5],
+    "run_outs": [None, 0, 1, 2, 5],
+    "stumpings": [None, 0, 1, 2, 5],
+}
+# Fields the baseline calc_* functions can't take None for
+REQUIRED = set(CHOICES) - {"batting_position", "match_inning"}
+HISTORY_SIZES = [0, 1, 2, 5, 20, 200]
+
+engine = create_engine("sqlite://")
+Base.metadata.create_all(engine)
+
+
+def allowed(field: str, missing: bool):
+    options = CHOICES[field]
+    return options if missing or field not in REQUIRED else [value for value in options if value is not None]
+
+
+def with_balls(match: dict):
+    overs = match["overs_bowled"]
+    return {**match, "balls_bowled": None if overs is None else overs_to_balls(overs)}
+
+
+def edge_match(rng: random.Random, missing: bool = True):
+    match = random_match(rng)
+    del match["user_id"]
+    for field in CHOICES:
+        match[field] = rng.choice(allowed(field, missing))
+    return with_balls(match)
+
+
+def generate_history(rng: random.Random, missing: bool):
+    return [edge_match(rng, missing) for _ in range(rng.choice(HISTORY_SIZES))]
+
+
+def shrink(prop, history, missing: bool):
+    """The smallest, simplest history found that still fails `prop`, and its failure."""
+    size = len(history) // 2
+    while size:
+        start = 0
+        while start < len(history):
+            candidate = history[:start] + history[start + size:]
+            if prop(candidate):
+                history = candidate
+            else:
+                start += size
+        size //= 2
+
+    for index, match in enumerate(history):
+        for field in CHOICES:
+            options = allowed(field, missing)
+            for value in options[:options.index(match[field])]:
+                candidate = [*history[:index], with_balls({**match, field: value}), *history[index + 1:]]
+                if prop(candidate):
+                    history, match = candidate, candidate[index]
+                    break
+    return history, prop(history)
+
+
+def describe(match: dict):
+    return ", ".join(f"{field}={value.name if isinstance(value, enum.Enum) else value}" for field, value in match.items() if field in CHOICES)
+
+
+def check_property(name: str, prop, cases: int, seed: int, missing: bool = True):
+    for case in range(cases):
+        rng = random.Random(f"{seed}:{name}:{case}")
+        history = generate_history(rng, missing and case % 2 == 0)
+        if not prop(history):
+            continue
+        history, failure = shrink(prop, history, missing and case % 2 == 0)
+        lines = "\n".join(f"  {describe(match)}" for match in history)
+        sys.exit(f"{name}: falsified at --seed {seed}, case {case}: {failure}\nshrunk to {len(history)} matches:\n{lines}")
+    print(f"{name}: {cases} histories (seed {seed}) passed")
+
+
+def baseline_batting_stats(matches):
+    all_matches_played = matches
+
+    total_innings = 0
+    total_runs_scored = 0
+    total_balls_played = 0
+    total_fours = 0
+    total_sixes = 0
+    highest_score = 0
+    total_dismissals_batting = 0
+    total_ducks = 0
+    total_30s = 0
+    total_50s = 0
+    total_100s = 0
+    total_30plus = 0
+    total_won = 0
+    total_lost = 0
+    total_no_result = 0
+
+    for match in all_matches_played:
+        if match.came_to_bat.value.lower() == "yes":
+            total_innings += 1
+        total_runs_scored += match.runs_scored
+        total_balls_played += match.balls_faced
+        total_fours += match.fours
+        total_sixes += match.sixes
+        highest_score = max(highest_score, match.runs_scored)
+        if match.runs_scored > 29:
+            total_30s += 1
+            total_30plus += 1
+            if match.runs_scored > 49:
+                total_50s += 1
+                total_30s -= 1
+                if match.runs_scored > 99:
+                    total_100s += 1
+                    total_50s -= 1
+        if match.match_result.value.lower() == "won":
+            total_won += 1
+        elif match.match_result.value.lower() == "lost":
+            total_lost += 1
+        else:
+            total_no_result += 1
+
+        if match.out.value.lower() == "yes":
+            total_dismissals_batting += 1
+            if (match.runs_scored == 0):
+                total_ducks += 1
+
+    batting_average = (total_runs_scored / total_dismissals_batting) if total_dismissals_batting else None
+    batting_strike_rate = (total_runs_scored / total_balls_played) * 100 if total_balls_played else None
+    balls_per_boundary = (total_balls_played / (total_fours + total_sixes)) if (total_fours + total_sixes) else None
+    win_pct = (total_won / len(all_matches_played)) * 100 if all_matches_played else None
+
+    return {
+        "matches": len(all_matches_played),
+        "innings": total_innings,
+        "runs_scored": total_runs_scored,
+        "balls_faced": total_balls_played,
+        "fours": total_fours,
+        "sixes": total_sixes,
+        "highest_score": highest_score,
+        "batting_average": round(batting_average, 2) if batting_average else None,
+        "batting_strike_rate": round(batting_strike_rate, 2) if batting_strike_rate else None,
+        "thirties": total_30s,
+        "fifties": total_50s,
+        "hundreds": total_100s,
+        "thirties_plus": total_30plus,
+        "balls_per_boundary": round(balls_per_boundary, 2) if balls_per_boundary else None,
+        "ducks": total_ducks,
+        "matches_won": total_won,
+        "win_pct": round(win_pct, 2) if win_pct is not None else None
+    }
+
+
+def baseline_bowling_stats(matches):
+    all_matches_played = matches
+
+    total_balls_bowled = 0
+    total_overs_bowled = 0
+    total_wickets_taken = 0
+    total_runs_conceded = 0
+    three_fers = 0
+    five_fers = 0
+    wickets_in_best_bowling = 0
+    runs_in_best_bowling = 0
+    inning = 0
+    catches = 0
+    runouts = 0
+    stumpings = 0
+
+    for match in all_matches_played:
+        if (match.overs_bowled):
+            inning += 1
+        total_wickets_taken += match.wickets
+        if match.wickets:
+            if (match.wickets > 4):
+                five_fers += 1
+            elif (match.wickets > 2):
+                three_fers += 1
+            if (match.wickets > wickets_in_best_bowling):
+                wickets_in_best_bowling = match.wickets
+                runs_in_best_bowling = match.runs_conceded
+            elif (match.wickets == wickets_in_best_bowling):
+                if (match.runs_conceded < runs_in_best_bowling):
+                    runs_in_best_bowling = match.runs_conceded
+        total_runs_conceded += match.runs_conceded
+        total_balls_bowled += math.floor(match.overs_bowled)*6 + (match.overs_bowled - math.floor(match.overs_bowled))*10
+        total_overs_bowled = (total_balls_bowled//6) + (total_balls_bowled%6)/10
+        catches += match.catches
+        runouts += match.run_outs
+        stumpings += match.stumpings
+
+    bowling_average = (total_runs_conceded / total_wickets_taken) if total_wickets_taken else None
+    economy_rate = (total_runs_conceded / total_balls_bowled)*6 if total_balls_bowled else None
+    bowling_strike_rate = (total_balls_bowled / total_wickets_taken) if total_wickets_taken else None
+    dismissals_per_match = round((catches + runouts) / len(all_matches_played), 2) if all_matches_played else None
+
+    return {
+        "matches": len(all_matches_played),
+        "innings": inning,
+        "overs_bowled": total_overs_bowled,
+        "runs_conceded": total_runs_conceded,
+        "wickets_taken": total_wickets_taken,
+        "best_bowling": f"{wickets_in_best_bowling}/{runs_in_best_bowling}" if wickets_in_best_bowling else None,
+        "three_fers": three_fers,
+        "five_fers": five_fers,
+        "bowling_average": round(bowling_average, 2) if bowling_average else None,
+        "bowling_strike_rate": round(bowling_strike_rate, 2) if bowling_strike_rate else None,
+        "economy_rate": round(economy_rate, 2) if economy_rate else None,
+        "catches": catches,
+        "runouts": runouts,
+        "stumpings": stumpings,
+        "dismissals_per_match": dismissals_per_match
+    }
+
+
+def same_stat(name, expected, actual):
+    if name == "overs_bowled":
+        # The baseline summed overs-derived balls as floats, so 18 balls could
+        # come out as 17.999... and print as "2.6" overs; compare the balls
+        return overs_to_balls(expected) == overs_to_balls(actual)
+    if isinstance(expected, float) and isinstance(actual, float):
+        # ... and its float ball count can tip a 2dp rate across a rounding edge
+        return abs(round(expected * 100) - round(actual * 100)) <= 1
+    return expected == actual
+
+
+def stats_diff(expected: dict, actual: dict):
+    return {name: (expected[name], actual.get(name)) for name in expected if not same_stat(name, expected[name], actual.get(name))}
+
+
+def store_user(db: Session, history):
+    user = User(username="case", email="case@example.com", hashed_password="-")
+    db.add(user)
+    db.flush()
+    if history:
+        db.execute(insert(Match), [{**match, "user_id": user.id} for match in history])
+    return user.id
+
+
+def row_matches(history):
+    # {(dimension, key): [match, ...]} for every rollup row the history has
+    rows = {}
+    for match in map(lambda values: SimpleNamespace(**values), history):
+        rows.setdefault((None, None), []).append(match)
+        for dimension in DIMENSIONS:
+            value = getattr(match, dimension)
+            if value is not None:
+                rows.setdefault((dimension, group_key(value)), []).append(match)
+    return rows
+
+
+def fold(empty, add, matches):
+    totals = empty()
+    for match in matches:
+        add(totals, match)
+    return totals
+
+
+def sql_rollups(db: Session, user_id: int):
+    """compute_user_rollups() as one aggregate query per breakdown, as it was before."""
+    rollups = {}
+    career = sql_counters(db, user_id)
+    if career["matches"]:
+        rollups[(None, None)] = career
+    for dimension in DIMENSIONS:
+        for key, counters in sql_group_counters(db, user_id, dimension).items():
+            rollups[(dimension, group_key(key))] = counters
+    return rollups
+
+
+def differing(expected: dict, actual: dict):
+    return sorted((key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)), key=str)
+
+
+def rollups_property(history):
+    with Session(engine) as db:
+        user_id = store_user(db, history)
+        rollups = compute_user_rollups(db, user_id)
+        folded = {
+            key: to_counters(fold(empty_batting_totals, add_batting_match, matches), fold(empty_bowling_totals, add_bowling_match, matches))
+            for key, matches in row_matches(history).items()
+        }
+        if rollups != folded:
+            return f"compute_user_rollups() differs from the per-match fold for {differing(folded, rollups)}"
+        expected = sql_rollups(db, user_id)
+        if rollups != expected:
+            return f"compute_user_rollups() differs from the per-breakdown SQL aggregates for {differing(expected, rollups)}"
+    return None
+
+
+def baseline_property(history):
+    with Session(engine) as db:
+        rollups = compute_user_rollups(db, store_user(db, history))
+    for key, matches in row_matches(history).items():
+        for name, baseline, current in (
+            ("batting", baseline_batting_stats, batting_stats),
+            ("bowling", baseline_bowling_stats, bowling_stats),
+        ):
+            diff = stats_diff(baseline(matches), current(rollups[key]))
+            if diff:
+                return f"{key}: {name} stats differ (baseline, rollups): {diff}"
+    return None
+
+
+def incremental_property(history):
+    with Session(engine) as db:
+        user_id = store_user(db, [])
+        matches = [Match(user_id=user_id, **values) for values in history]
+        imported, added = matches[:len(matches) // 2], matches[len(matches) // 2:]
+        db.add_all(imported)
+        db.flush()
+        add_matches(db, imported)
+        for match in added:
+            db.add(match)
+            db.flush()
+            apply_match_change(db, new=match)
+
+        # Edit every third match into the next one's values, delete the ones after
+        for index in range(1, len(matches), 3):
+            match, old = matches[index], snapshot(matches[index])
+            for field, value in with_balls({field: history[(index + 1) % len(history)][field] for field in CHOICES}).items():
+                setattr(match, field, value)
+            db.flush()
+            apply_match_change(db, old=old, new=match)
+        for index in range(2, len(matches), 3):
+            old = snapshot(matches[index])
+            db.delete(matches[index])
+            db.flush()
+            apply_match_change(db, old=old)
+
+        drift = find_drift(db, user_id)
+        if drift:
+            return f"stored rollups drifted, (dimension, key, field, stored, expected): {drift[:5]}"
+    return None
+
+
+def best_ms(fn, number: int = 1):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1000
+
+
+def time_sizes(sizes, seed: int):
+    rng = random.Random(seed)
+    print(f"{'matches':>8} {'baseline career':>16} {'SQL per breakdown':>18} {'compute_user_rollups':>21}  (ms, best of 3)")
+    for size in sizes:
+        with Session(engine) as db:
+            # Without missing values, which the baseline can't handle
+            user_id = store_user(db, [edge_match(rng, missing=False) for _ in range(size)])
+
+            def baseline():
+                loaded = load_user_matches(db, user_id)
+                db.expunge_all()
+                return baseline_batting_stats(loaded), baseline_bowling_stats(loaded)
+
+            assert compute_user_rollups(db, user_id) == sql_rollups(db, user_id)
+            print(f"{size:>8} {best_ms(baseline):>16.2f} {best_ms(lambda: sql_rollups(db, user_id)):>18.2f} "
+                  f"{best_ms(lambda: compute_user_rollups(db, user_id)):>21.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the stats rollups against the per-match and baseline stats, then time them")
+    parser.add_argument("--cases", type=int, default=200, help="generated histories per property")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000, 50000], help="history sizes to time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    check_property("rollups", rollups_property, args.cases, args.seed)
+    check_property("baseline", baseline_property, args.cases, args.seed, missing=False)
+    check_property("incremental", incremental_property, args.cases, args.seed)
+    time_sizes(args.sizes, args.seed)
+
+
+if __name__ == "__main__":
+    main()